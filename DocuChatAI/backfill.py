@@ -0,0 +1,452 @@
+import argparse
+import asyncio
+import os
+import signal
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from database import SessionLocal, init_db, BackfillJob, Document, StageRun
+from pipeline_stages import PipelineStages
+from worker import DocumentProcessor, default_worker_id
+from blob_store import blob_store, is_blob_ref
+from retention import load_archived
+
+
+STAGE_ORDER = ["classify", "extract", "pii_detect", "validate", "lineage", "medallion"]
+
+# Component -> (first stage it invalidates, version column, PipelineStages attribute)
+COMPONENTS = {
+    "classification": ("classify", Document.classification_model, "CLASSIFICATION_MODEL"),
+    "extraction": ("extract", Document.extraction_model, "EXTRACTION_MODEL"),
+    "validation": ("validate", Document.validation_version, "VALIDATION_VERSION")
+}
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_CONCURRENCY = 8
+
+# A running job stamps updated_at every heartbeat; one that has missed
+# several was orphaned by a crash or redeploy and may be resumed.
+HEARTBEAT_SECONDS = float(os.environ.get("BASIRA_BACKFILL_HEARTBEAT_SECONDS", "15"))
+STALE_HEARTBEATS = 4
+
+# Documents a worker held when the backfill reached them are retried once the
+# scan is done, backing off from RETRY_SECONDS, before the job pauses.
+RETRY_SECONDS = float(os.environ.get("BASIRA_BACKFILL_RETRY_SECONDS", "5"))
+RETRY_ROUNDS = int(os.environ.get("BASIRA_BACKFILL_RETRY_ROUNDS", "6"))
+
+
+def _current_version(component: str) -> str:
+    return getattr(PipelineStages, COMPONENTS[component][2])
+
+
+def _stale_filter(components: List[str]):
+    conditions = []
+    for component in components:
+        _, column, _ = COMPONENTS[component]
+        conditions.append(or_(column.is_(None), column != _current_version(component)))
+    return or_(*conditions)
+
+
+def first_stale_stage(document: Document, components: List[str]) -> Optional[str]:
+    stale = [
+        COMPONENTS[component][0]
+        for component in components
+        if getattr(document, COMPONENTS[component][1].key) != _current_version(component)
+    ]
+    if not stale:
+        return None
+    return min(stale, key=STAGE_ORDER.index)
+
+
+def _latest_outputs(db: Session, document_id: str) -> Dict[str, Any]:
+    outputs = {}
+    for row in load_archived(db, document_id, "stage_runs"):
+        if row["status"] == "completed":
+            outputs[row["stage_name"]] = row["output_data"]
+    for row in db.query(StageRun).filter(
+        StageRun.document_id == document_id,
+        StageRun.status == "completed"
+    ).order_by(StageRun.started_at).all():
+        outputs[row.stage_name] = row.output_data
+    return outputs
+
+
+def build_context(db: Session, document: Document, start_stage: str) -> Tuple[dict, str]:
+    # Rebuilds the pipeline context from stored upstream outputs. When an
+    # output is missing the start moves upstream to the stage that makes it.
+    context = DocumentProcessor.new_context(document)
+    start = STAGE_ORDER.index(start_stage)
+    outputs = _latest_outputs(db, document.id)
+
+    if start > STAGE_ORDER.index("classify"):
+        if not document.document_type:
+            return context, "classify"
+        context["document_type"] = document.document_type
+
+    if start > STAGE_ORDER.index("extract"):
+        if outputs.get("extract") is None:
+            return context, "extract"
+        context["extracted_data"] = blob_store.resolve(db, outputs["extract"])
+
+    if start > STAGE_ORDER.index("pii_detect"):
+        redacted = (outputs.get("pii_detect") or {}).get("redacted_data")
+        if redacted is None:
+            return context, "pii_detect"
+        context["redacted_ref"] = redacted if is_blob_ref(redacted) else blob_store.put(db, redacted)
+        context["redacted_data"] = blob_store.resolve(db, redacted)
+
+    return context, start_stage
+
+
+class _RateLimiter:
+
+    def __init__(self, per_second: Optional[float]):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def job_progress(job: BackfillJob) -> Dict[str, Any]:
+    elapsed = job.elapsed_seconds or 0.0
+    processed = job.processed or 0
+    throughput = processed / elapsed if elapsed > 0 else 0.0
+    remaining = max(0, (job.total or 0) - processed)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "components": job.components,
+        "document_type": job.document_type,
+        "uploaded_after": job.uploaded_after,
+        "uploaded_before": job.uploaded_before,
+        "total": job.total or 0,
+        "processed": processed,
+        "succeeded": job.succeeded or 0,
+        "failed": job.failed or 0,
+        "skipped": len(job.skipped_ids or []),
+        "remaining": remaining,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(throughput, 3),
+        "eta_seconds": round(remaining / throughput, 1) if throughput > 0 else None,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "last_error": job.last_error
+    }
+
+
+class BackfillEngine:
+
+    def __init__(self, processor: Optional[DocumentProcessor] = None,
+                 retry_seconds: float = RETRY_SECONDS, retry_rounds: int = RETRY_ROUNDS,
+                 heartbeat_seconds: float = HEARTBEAT_SECONDS):
+        self.processor = processor or DocumentProcessor(worker_id=f"backfill:{default_worker_id()}")
+        self.retry_seconds = retry_seconds
+        self.retry_rounds = retry_rounds
+        self.heartbeat_seconds = heartbeat_seconds
+
+    @staticmethod
+    def _selection(job: BackfillJob) -> list:
+        filters = [
+            Document.status.in_(["completed", "failed"]),
+            _stale_filter(job.components)
+        ]
+        if job.document_type:
+            filters.append(Document.document_type == job.document_type)
+        if job.uploaded_after:
+            filters.append(Document.upload_timestamp >= job.uploaded_after)
+        if job.uploaded_before:
+            filters.append(Document.upload_timestamp < job.uploaded_before)
+        return filters
+
+    def create_job(self, db: Session, components: List[str], document_type: Optional[str] = None,
+                   uploaded_after: Optional[datetime] = None, uploaded_before: Optional[datetime] = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE, concurrency: int = DEFAULT_CONCURRENCY,
+                   rate_limit: Optional[float] = None) -> BackfillJob:
+        unknown = [c for c in components if c not in COMPONENTS]
+        if not components or unknown:
+            raise ValueError(f"Components must be chosen from: {', '.join(COMPONENTS)}")
+        if batch_size < 1 or concurrency < 1:
+            raise ValueError("batch_size and concurrency must be at least 1")
+
+        job = BackfillJob(
+            id=str(uuid.uuid4()),
+            created_at=datetime.utcnow(),
+            status="pending",
+            components=list(components),
+            document_type=document_type,
+            uploaded_after=uploaded_after,
+            uploaded_before=uploaded_before,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            rate_limit=rate_limit,
+            processed=0,
+            succeeded=0,
+            failed=0,
+            elapsed_seconds=0.0
+        )
+        job.total = db.query(Document).filter(*self._selection(job)).count()
+        db.add(job)
+        db.commit()
+        return job
+
+    def _next_batch(self, db: Session, job: BackfillJob) -> List[Tuple[str, datetime]]:
+        query = db.query(Document.id, Document.upload_timestamp).filter(*self._selection(job))
+        if job.cursor_timestamp is not None:
+            query = query.filter(or_(
+                Document.upload_timestamp > job.cursor_timestamp,
+                and_(Document.upload_timestamp == job.cursor_timestamp, Document.id > job.cursor_id)
+            ))
+        return query.order_by(Document.upload_timestamp, Document.id).limit(job.batch_size).all()
+
+    async def _rerun(self, db: Session, job: BackfillJob, document_id: str) -> bool:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        start_stage = first_stale_stage(document, job.components)
+        if start_stage is None:
+            return True
+
+        context, start_stage = build_context(db, document, start_stage)
+        context["backfill_job_id"] = job.id
+        context["rerun_from_stage"] = start_stage
+        return await self.processor.run_stages(db, document, context, start_stage)
+
+    async def _reprocess(self, job: BackfillJob, document_id: str) -> Optional[bool]:
+        db = SessionLocal()
+        try:
+            if not self.processor.claim_for_reprocessing(db, document_id):
+                return None
+            # hold_lease renews the lease while the document is rerun and
+            # releases it afterwards, whether the rerun finished or not.
+            return await self.processor.hold_lease(document_id, self._rerun(db, job, document_id))
+        finally:
+            db.close()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            db = SessionLocal()
+            try:
+                db.query(BackfillJob).filter(
+                    BackfillJob.id == job_id,
+                    BackfillJob.status == "running"
+                ).update({BackfillJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                print(f"Backfill {job_id} heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    @staticmethod
+    async def _pause(stop_event: Optional[asyncio.Event], seconds: float):
+        if stop_event is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(stop_event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def claim(self, db: Session, job_id: str) -> bool:
+        # Compare-and-swap into "running", so two resumes (or a resume racing
+        # a job that is still alive) never run two engines on one cursor.
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.heartbeat_seconds * STALE_HEARTBEATS)
+        claimed = db.query(BackfillJob).filter(
+            BackfillJob.id == job_id,
+            or_(
+                BackfillJob.status.in_(["pending", "paused", "failed"]),
+                and_(BackfillJob.status == "running",
+                     or_(BackfillJob.updated_at.is_(None), BackfillJob.updated_at < stale))
+            )
+        ).update({
+            BackfillJob.status: "running",
+            BackfillJob.updated_at: now
+        }, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+
+    async def run(self, job_id: str, stop_event: Optional[asyncio.Event] = None,
+                  claimed: bool = False) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            job = db.query(BackfillJob).filter(BackfillJob.id == job_id).first()
+            if job is None:
+                raise ValueError(f"Backfill job {job_id} not found")
+            if not claimed and not self.claim(db, job_id):
+                db.refresh(job)
+                print(f"Backfill {job_id} is {job.status}, not starting it again")
+                return job_progress(job)
+
+            db.refresh(job)
+            job.started_at = job.started_at or datetime.utcnow()
+            db.commit()
+
+            limiter = _RateLimiter(job.rate_limit)
+            slots = asyncio.Semaphore(job.concurrency)
+            base_elapsed = job.elapsed_seconds or 0.0
+            resumed_at = time.perf_counter()
+
+            job_task = asyncio.current_task()
+
+            async def reprocess(document_id: str):
+                async with slots:
+                    await limiter.wait()
+                    try:
+                        return await self._reprocess(job, document_id)
+                    except asyncio.CancelledError:
+                        # The lease heartbeat cancels just this document when
+                        # another worker took it over; only a cancellation of
+                        # the job itself stops the job.
+                        if job_task.cancelling():
+                            raise
+                        asyncio.current_task().uncancel()
+                        print(f"Backfill {job_id}: lost the lease on {document_id}, will retry it")
+                        return None
+                    except Exception as e:
+                        return e
+
+            heartbeat = asyncio.create_task(self._heartbeat(job.id))
+            retries = 0
+            try:
+                while True:
+                    if stop_event is not None and stop_event.is_set():
+                        job.status = "paused"
+                        break
+
+                    batch = self._next_batch(db, job)
+                    if batch:
+                        document_ids = [document_id for document_id, _ in batch]
+                    elif job.skipped_ids:
+                        if retries >= self.retry_rounds:
+                            job.status = "paused"
+                            job.last_error = (
+                                f"{len(job.skipped_ids)} documents stayed claimed by other workers, "
+                                "resume the job to retry them"
+                            )
+                            break
+                        await self._pause(stop_event, self.retry_seconds * 2 ** retries)
+                        retries += 1
+                        if stop_event is not None and stop_event.is_set():
+                            continue
+                        document_ids, job.skipped_ids = job.skipped_ids, []
+                    else:
+                        job.status = "completed"
+                        job.finished_at = datetime.utcnow()
+                        break
+
+                    results = await asyncio.gather(*(reprocess(document_id) for document_id in document_ids))
+                    skipped = []
+                    for document_id, result in zip(document_ids, results):
+                        if result is True:
+                            job.succeeded += 1
+                        elif result is None:
+                            skipped.append(document_id)
+                            continue
+                        else:
+                            job.failed += 1
+                            if isinstance(result, Exception):
+                                job.last_error = f"{document_id}: {result}"
+
+                    job.processed += len(document_ids) - len(skipped)
+                    # A new list, so the JSON column is seen as changed.
+                    job.skipped_ids = (job.skipped_ids or []) + skipped
+                    if batch:
+                        job.cursor_id, job.cursor_timestamp = batch[-1]
+                    job.elapsed_seconds = base_elapsed + (time.perf_counter() - resumed_at)
+                    job.updated_at = datetime.utcnow()
+                    db.commit()
+
+                    progress = job_progress(job)
+                    print(
+                        f"Backfill {job.id}: {progress['processed']}/{progress['total']} "
+                        f"({progress['failed']} failed, {progress['skipped']} held by workers, "
+                        f"{progress['throughput_per_second']} docs/s)"
+                    )
+            except asyncio.CancelledError:
+                job.status = "paused"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.last_error = str(e)
+            finally:
+                heartbeat.cancel()
+                job.elapsed_seconds = base_elapsed + (time.perf_counter() - resumed_at)
+                job.updated_at = datetime.utcnow()
+                db.commit()
+
+            return job_progress(job)
+        finally:
+            db.close()
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+async def _run_cli_job(engine: BackfillEngine, job_id: str):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    return await engine.run(job_id, stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run documents affected by a model or rule version change")
+    parser.add_argument("--component", action="append", choices=list(COMPONENTS), default=[],
+                        help="pipeline component whose version changed (repeatable)")
+    parser.add_argument("--document-type", help="only documents of this type")
+    parser.add_argument("--uploaded-after", type=_parse_date, help="ISO date, inclusive")
+    parser.add_argument("--uploaded-before", type=_parse_date, help="ISO date, exclusive")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, help="maximum documents started per second")
+    parser.add_argument("--dry-run", action="store_true", help="only count matching documents")
+    parser.add_argument("--resume", metavar="JOB_ID", help="continue a paused, failed or orphaned job")
+    parser.add_argument("--status", metavar="JOB_ID", help="print a job's progress and exit")
+    args = parser.parse_args()
+
+    init_db()
+    engine = BackfillEngine()
+    db = SessionLocal()
+    try:
+        if args.status:
+            job = db.query(BackfillJob).filter(BackfillJob.id == args.status).first()
+            print(job_progress(job) if job else f"Backfill job {args.status} not found")
+            return
+
+        if args.resume:
+            job_id = args.resume
+        else:
+            if not args.component:
+                parser.error("at least one --component is required")
+            job = engine.create_job(
+                db, args.component, args.document_type, args.uploaded_after, args.uploaded_before,
+                args.batch_size, args.concurrency, args.rate
+            )
+            if args.dry_run:
+                print(f"{job.total} documents would be reprocessed")
+                db.delete(job)
+                db.commit()
+                return
+            job_id = job.id
+            print(f"Created backfill job {job_id} for {job.total} documents")
+    finally:
+        db.close()
+
+    print(asyncio.run(_run_cli_job(engine, job_id)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import SessionLocal, init_db, Blob, MedallionData, StageRun
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BLOB_REF_KEY = "$blob"
+BLOB_CACHE_SIZE = int(os.environ.get("BASIRA_BLOB_CACHE_SIZE", "1024"))
+
+
+def _canonical_json(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF_KEY in value
+
+
+def _insert_if_missing(db: Session, values: Dict[str, Any]):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        db.execute(insert(Blob).values(**values).on_conflict_do_nothing(index_elements=["hash"]))
+        return
+    try:
+        with db.begin_nested():
+            db.add(Blob(**values))
+    except IntegrityError:
+        pass
+
+
+class BlobStore:
+
+    def __init__(self, cache_size: int = BLOB_CACHE_SIZE, codec: Optional[str] = None):
+        self.cache_size = cache_size
+        self.codec = codec or ("zstd" if zstandard is not None else "zlib")
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=6).compress(raw)
+        return zlib.compress(raw, 6)
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Blob was written with zstd but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _remember(self, digest: str, raw: bytes):
+        with self._lock:
+            self._cache[digest] = raw
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, db: Session, obj: Any) -> Dict[str, str]:
+        raw = _canonical_json(obj)
+        digest = hashlib.sha256(raw).hexdigest()
+
+        # Identical payloads hash to the same key, so storing a blob that
+        # already exists (or that a concurrent writer just stored) is a no-op.
+        # The cache is only filled on read: until the caller commits, the
+        # blob may still be rolled back with its transaction.
+        _insert_if_missing(db, {
+            "hash": digest,
+            "codec": self.codec,
+            "size": len(raw),
+            "data": self._compress(raw),
+            "created_at": datetime.utcnow()
+        })
+
+        return {BLOB_REF_KEY: digest}
+
+    def get(self, db: Session, digest: str) -> Any:
+        with self._lock:
+            raw = self._cache.get(digest)
+            if raw is not None:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+        if raw is None:
+            self.misses += 1
+            blob = db.query(Blob).filter(Blob.hash == digest).first()
+            if blob is None:
+                raise KeyError(f"Blob {digest} not found")
+            raw = self._decompress(blob.codec, blob.data)
+            self._remember(digest, raw)
+        return json.loads(raw)
+
+    def resolve(self, db: Session, value: Any) -> Any:
+        if is_blob_ref(value):
+            return self.resolve(db, self.get(db, value[BLOB_REF_KEY]))
+        if isinstance(value, dict):
+            return {k: self.resolve(db, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(db, v) for v in value]
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "codec": self.codec,
+            "cached": cached,
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+blob_store = BlobStore()
+
+
+def _externalize_row(db: Session, store: BlobStore, value: Any, keys) -> Any:
+    if value is None or is_blob_ref(value):
+        return value
+    if keys is None:
+        return store.put(db, value)
+    updated = dict(value)
+    for key in keys:
+        if updated.get(key) is not None and not is_blob_ref(updated[key]):
+            updated[key] = store.put(db, updated[key])
+    return updated
+
+
+def externalize_existing(batch_size: int = 500) -> Dict[str, int]:
+    # Rewrites payloads stored inline before the blob store existed.
+    stage_keys = {"extract": None, "pii_detect": ["redacted_data"]}
+    layer_keys = {"silver": ["redacted_data"], "gold": ["curated_data"]}
+    moved = {"stage_runs": 0, "medallion_data": 0}
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            rows = db.query(StageRun).filter(
+                StageRun.id > last_id,
+                StageRun.stage_name.in_(list(stage_keys))
+            ).order_by(StageRun.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                updated = _externalize_row(db, blob_store, row.output_data, stage_keys[row.stage_name])
+                if updated != row.output_data:
+                    row.output_data = updated
+                    moved["stage_runs"] += 1
+            last_id = rows[-1].id
+            db.commit()
+
+        last_id = 0
+        while True:
+            rows = db.query(MedallionData).filter(
+                MedallionData.id > last_id,
+                MedallionData.layer.in_(list(layer_keys))
+            ).order_by(MedallionData.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                updated = _externalize_row(db, blob_store, row.data, layer_keys[row.layer])
+                if updated != row.data:
+                    row.data = updated
+                    moved["medallion_data"] += 1
+            last_id = rows[-1].id
+            db.commit()
+    finally:
+        db.close()
+
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the content-addressed payload blob store")
+    parser.add_argument("--externalize", action="store_true",
+                        help="move payloads stored inline by older versions into the blob store")
+    args = parser.parse_args()
+
+    init_db()
+    if args.externalize:
+        print(externalize_existing())
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
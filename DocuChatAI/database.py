@@ -1,14 +1,28 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, Float, JSON, Text
+from sqlalchemy import create_engine, event, inspect, text, Column, String, DateTime, Integer, Float, JSON, Text, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import json
+import os
+import zlib
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./basira.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("BASIRA_DATABASE_URL", "sqlite:///./basira.db")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30}
 )
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the API and any number of worker processes read while one of
+    # them holds the write lock for a lease update or a stage commit.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -20,11 +34,20 @@ class Document(Base):
     id = Column(String, primary_key=True, index=True)
     filename = Column(String)
     file_path = Column(String)
-    upload_timestamp = Column(DateTime, default=datetime.utcnow)
+    upload_timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     current_stage = Column(String, default="queued")
     document_type = Column(String, nullable=True)
     status = Column(String, default="processing")
     error_message = Column(Text, nullable=True)
+    priority = Column(String, default="standard", index=True)
+    tenant_id = Column(String, nullable=True, index=True)
+    dispatched_at = Column(DateTime, nullable=True)
+    classification_model = Column(String, nullable=True)
+    extraction_model = Column(String, nullable=True)
+    validation_version = Column(String, nullable=True, index=True)
+    lease_owner = Column(String, nullable=True, index=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
 
 
 class StageRun(Base):
@@ -53,6 +76,7 @@ class LineageLog(Base):
     validation_version = Column(String, nullable=True)
     execution_arn = Column(String, nullable=True)
     event_metadata = Column(JSON, nullable=True)
+    event_id = Column(String, unique=True, index=True, nullable=True)
 
 
 class MedallionData(Base):
@@ -65,6 +89,66 @@ class MedallionData(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ArchivedRecord(Base):
+    __tablename__ = "archived_records"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    source_table = Column(String)
+    partition_key = Column(String, index=True)
+    document_id = Column(String, index=True)
+    record_count = Column(Integer)
+    payload = Column(LargeBinary)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BackfillJob(Base):
+    __tablename__ = "backfill_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String, default="pending")
+    components = Column(JSON)
+    document_type = Column(String, nullable=True)
+    uploaded_after = Column(DateTime, nullable=True)
+    uploaded_before = Column(DateTime, nullable=True)
+    batch_size = Column(Integer, default=200)
+    concurrency = Column(Integer, default=8)
+    rate_limit = Column(Float, nullable=True)
+    cursor_timestamp = Column(DateTime, nullable=True)
+    cursor_id = Column(String, nullable=True)
+    skipped_ids = Column(JSON, nullable=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0.0)
+    last_error = Column(Text, nullable=True)
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    
+    hash = Column(String, primary_key=True)
+    codec = Column(String)
+    size = Column(Integer)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SearchIndexEntry(Base):
+    __tablename__ = "document_search_rows"
+    
+    document_id = Column(String, primary_key=True)
+    search_rowid = Column(Integer, index=True)
+    indexed_at = Column(DateTime, default=datetime.utcnow)
+
+
+SEARCH_TABLE = "document_search"
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -73,5 +157,65 @@ def get_db():
         db.close()
 
 
-def init_db():
+def _migrate_schema():
+    # create_all() never alters existing tables, so columns and indexes added
+    # to the models after a database was first created are applied here.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                if column.index:
+                    conn.execute(text(
+                        f'CREATE {"UNIQUE " if column.unique else ""}INDEX IF NOT EXISTS '
+                        f'ix_{table.name}_{column.name} ON {table.name} ({column.name})'
+                    ))
+
+
+def _create_search_index():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                "USING fts5(filename, document_type, fields, content, tokenize='unicode61')"
+            ))
+    except Exception as e:
+        print(f"Full-text search disabled, SQLite FTS5 is unavailable: {e}")
+
+
+def schema_fingerprint() -> int:
+    # Changes whenever a table, column, column type or index is added to the
+    # models, which is exactly when create_all() and _migrate_schema() have work to do.
+    spec = [SEARCH_TABLE]
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            spec.append(f"{table.name}.{column.name}:{column.type}:{bool(column.index)}:{bool(column.unique)}")
+    return zlib.crc32("\n".join(spec).encode("utf-8")) & 0x7FFFFFFF
+
+
+def schema_is_current() -> bool:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar() == schema_fingerprint()
+
+
+def init_db() -> bool:
+    # Stamps the database with the schema fingerprint so every later call
+    # (API replicas, workers, CLIs) is a single PRAGMA read instead of a
+    # full reflection pass. Returns True when the schema had to be changed.
+    if schema_is_current():
+        return False
     Base.metadata.create_all(bind=engine)
+    _migrate_schema()
+    _create_search_index()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {schema_fingerprint()}")
+    return True
+
+
+if __name__ == "__main__":
+    print("Schema migrated" if init_db() else "Schema is up to date")
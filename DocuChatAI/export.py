@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from database import SessionLocal, Document, MedallionData
+from blob_store import blob_store
+
+
+EXPORT_LAYERS = ("silver", "gold")
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+CSV_COLUMNS = ["document_id", "filename", "document_type", "layer", "upload_timestamp", "created_at", "data"]
+FETCH_SIZE = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def iter_layer_rows(layer: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    document_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    # A session of its own: the response body is produced after the request's
+    # dependencies have been torn down.
+    db = SessionLocal()
+    try:
+        query = db.query(
+            MedallionData.document_id,
+            MedallionData.layer,
+            MedallionData.created_at,
+            MedallionData.data,
+            Document.filename,
+            Document.document_type,
+            Document.upload_timestamp
+        ).join(Document, Document.id == MedallionData.document_id).filter(MedallionData.layer == layer)
+
+        if start is not None:
+            query = query.filter(Document.upload_timestamp >= start)
+        if end is not None:
+            query = query.filter(Document.upload_timestamp < end)
+        if document_type:
+            query = query.filter(Document.document_type == document_type)
+
+        for row in query.order_by(MedallionData.id).yield_per(FETCH_SIZE):
+            yield {
+                "document_id": row.document_id,
+                "filename": row.filename,
+                "document_type": row.document_type,
+                "layer": row.layer,
+                "upload_timestamp": row.upload_timestamp.isoformat() if row.upload_timestamp else None,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "data": blob_store.resolve(db, row.data)
+            }
+    finally:
+        db.close()
+
+
+def _ndjson_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+
+def _csv_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        row = dict(row, data=json.dumps(row["data"], default=str, ensure_ascii=False))
+        writer.writerow([row[column] for column in CSV_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def _chunked(lines: Iterator[str]) -> Iterator[bytes]:
+    pending = []
+    size = 0
+    for line in lines:
+        encoded = line.encode("utf-8")
+        pending.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_BYTES:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def _gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(layer: str, export_format: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, document_type: Optional[str] = None,
+                  gzip: bool = False) -> Iterator[bytes]:
+    rows = iter_layer_rows(layer, start, end, document_type)
+    lines = _csv_lines(rows) if export_format == "csv" else _ndjson_lines(rows)
+    chunks = _chunked(lines)
+    return _gzipped(chunks) if gzip else chunks
@@ -0,0 +1,310 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# A malformed or adversarial PDF can keep the PDF parser or a backtracking
+# regex busy for minutes. Every pipeline stage gets a wall-clock budget, and
+# the CPU-heavy work inside a stage runs in sandbox processes with a CPU
+# budget of its own, so an overrun can be stopped without stalling the event
+# loop. A document that exceeds a budget is quarantined instead of retried.
+#
+# CPU budgets apply to sandboxed calls only: stages share the event loop
+# thread, so CPU time cannot be attributed to one of them in-process.
+BUDGET_SCALE = float(os.environ.get("BASIRA_BUDGET_SCALE", "1.0"))
+SANDBOX_PROCESSES = int(os.environ.get("BASIRA_SANDBOX_PROCESSES", "2"))
+
+# Stage -> wall-clock seconds, awaits included. No CPU budget, see above.
+STAGE_TIMEOUTS = {
+    "classify": 60.0,
+    "extract": 60.0,
+    "pii_detect": 30.0,
+    "validate": 30.0,
+    "lineage": 30.0,
+    "medallion": 60.0
+}
+
+# Sandboxed work -> (CPU seconds, wall-clock seconds) for one call.
+SANDBOX_CPU_BUDGETS = {
+    "pdf_text": (20.0, 40.0),
+    "classify": (5.0, 10.0),
+    "extract": (10.0, 20.0),
+    "pii": (10.0, 20.0)
+}
+
+
+class BudgetExceeded(Exception):
+    # label is the sandboxed work ("pdf_text", "extract", ...) or, for a
+    # stage's own budget, the stage name; budget is "cpu", "wall" or
+    # "stage_wall". The fields are the exception's args so it pickles back
+    # from a sandbox process intact.
+
+    def __init__(self, label: str, budget: str, limit_seconds: float, measured_seconds: float):
+        super().__init__(label, budget, limit_seconds, measured_seconds)
+        self.label = label
+        self.budget = budget
+        self.limit_seconds = limit_seconds
+        self.measured_seconds = measured_seconds
+
+    def __str__(self):
+        if self.budget == "cpu":
+            return (f"{self.label} exceeded its CPU budget of {self.limit_seconds:g}s "
+                    f"after {self.measured_seconds:.2f}s of CPU")
+        prefix = "Stage " if self.budget == "stage_wall" else ""
+        return (f"{prefix}{self.label} exceeded its wall-clock budget of {self.limit_seconds:g}s "
+                f"after {self.measured_seconds:.2f}s")
+
+    def details(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "budget": self.budget,
+            "limit_seconds": self.limit_seconds,
+            "measured_seconds": round(self.measured_seconds, 3)
+        }
+
+
+class SandboxCrashed(Exception):
+    pass
+
+
+class _CpuBudgetInterrupt(BaseException):
+    # A BaseException, like KeyboardInterrupt, so parser code that catches
+    # Exception cannot swallow it and carry on.
+    pass
+
+
+_armed = False
+
+
+def _on_cpu_exhausted(signum, frame):
+    # A SIGPROF still in flight after the call has unwound is ignored, so it
+    # can neither abort a finished call nor escape as a stray exception.
+    if _armed:
+        raise _CpuBudgetInterrupt()
+
+
+def _init_sandbox():
+    # ITIMER_PROF counts this process's CPU time. The handler also interrupts
+    # a running regex, since the re module checks for signals while matching.
+    signal.signal(signal.SIGPROF, _on_cpu_exhausted)
+
+
+def _call_with_cpu_budget(label: str, cpu_seconds: float, fn: Callable, args: tuple) -> Any:
+    global _armed
+    started = time.process_time()
+    _armed = True
+    try:
+        try:
+            # Fires again every 100ms of CPU time until the call has unwound.
+            signal.setitimer(signal.ITIMER_PROF, cpu_seconds, 0.1)
+            return fn(*args)
+        finally:
+            # An interrupt raised before this disarms is caught just below.
+            _armed = False
+            signal.setitimer(signal.ITIMER_PROF, 0)
+    except _CpuBudgetInterrupt:
+        pass
+    # The timer fired, so the kernel counted at least the budget; process_time
+    # samples a different clock and can read a few milliseconds short.
+    raise BudgetExceeded(label, "cpu", cpu_seconds, max(cpu_seconds, time.process_time() - started))
+
+
+def _call_each_with_cpu_budget(label: str, cpu_seconds: float, fn: Callable, items: list) -> List[Any]:
+    # One sandbox round trip for a whole batch; every item still gets its own
+    # CPU budget, and a failed item comes back as its exception.
+    results = []
+    for item in items:
+        try:
+            results.append(_call_with_cpu_budget(label, cpu_seconds, fn, (item,)))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class _SandboxProcess:
+
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn"), initializer=_init_sandbox
+        )
+        self.pid = self.executor.submit(os.getpid).result()
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class Sandbox:
+    # Single-worker processes, checked out one call at a time. A call that
+    # runs out of CPU interrupts itself and its process is reused; one that
+    # runs out of wall-clock time, or whose caller is cancelled, has its
+    # process killed so the slot is reclaimed and no other call is affected.
+
+    def __init__(self, processes: int = SANDBOX_PROCESSES,
+                 budgets: Optional[Dict[str, Tuple[float, float]]] = None, scale: float = BUDGET_SCALE):
+        self.processes = max(1, processes)
+        self.budgets = {
+            label: (cpu * scale, wall * scale) for label, (cpu, wall) in (budgets or SANDBOX_CPU_BUDGETS).items()
+        }
+        self._idle: List[_SandboxProcess] = []
+        self._lock = threading.Lock()
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.started = 0
+        self.killed = 0
+        self.crashed = 0
+        self.exceeded: Dict[str, int] = {}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.processes)
+        return slots
+
+    def _spawn(self) -> _SandboxProcess:
+        process = _SandboxProcess()
+        with self._lock:
+            self.started += 1
+        return process
+
+    async def _checkout(self) -> _SandboxProcess:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        spawn = asyncio.ensure_future(asyncio.to_thread(self._spawn))
+        try:
+            return await asyncio.shield(spawn)
+        except asyncio.CancelledError:
+            # The start-up thread cannot be interrupted; keep its process for later.
+            spawn.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or self._checkin(f.result(), True)
+            )
+            raise
+
+    def _checkin(self, process: _SandboxProcess, healthy: bool):
+        if not healthy:
+            process.kill()
+            with self._lock:
+                self.killed += 1
+            return
+        with self._lock:
+            if len(self._idle) < self.processes:
+                self._idle.append(process)
+                return
+        process.close()
+
+    def _record_exceeded(self, label: str):
+        with self._lock:
+            self.exceeded[label] = self.exceeded.get(label, 0) + 1
+
+    async def run(self, label: str, fn: Callable, *args) -> Any:
+        return await self._call(label, 1, _call_with_cpu_budget, fn, args)
+
+    async def run_batch(self, label: str, fn: Callable, items: List[Any]) -> List[Any]:
+        # fn(item) for every item in a single sandboxed call, with a wall
+        # budget of one item's times the batch size. Failed items come back
+        # as exception instances in their position.
+        if not items:
+            return []
+        results = await self._call(label, len(items), _call_each_with_cpu_budget, fn, list(items))
+        for result in results:
+            if isinstance(result, BudgetExceeded):
+                self._record_exceeded(label)
+        return results
+
+    async def _call(self, label: str, size: int, runner: Callable, fn: Callable, payload: Any) -> Any:
+        if label not in self.budgets:
+            raise ValueError(f"No sandbox budget for '{label}', expected one of: {', '.join(self.budgets)}")
+        cpu_seconds, wall_seconds = self.budgets[label]
+        wall_seconds *= size
+
+        async with self._semaphore():
+            process = await self._checkout()
+            with self._lock:
+                self.calls += 1
+            healthy = False
+            started = time.perf_counter()
+            try:
+                future = process.executor.submit(runner, label, cpu_seconds, fn, payload)
+                result = await asyncio.wait_for(asyncio.wrap_future(future), wall_seconds)
+                healthy = True
+                return result
+            except asyncio.TimeoutError:
+                self._record_exceeded(label)
+                raise BudgetExceeded(label, "wall", wall_seconds, time.perf_counter() - started) from None
+            except BudgetExceeded:
+                healthy = True
+                self._record_exceeded(label)
+                raise
+            except BrokenProcessPool as e:
+                with self._lock:
+                    self.crashed += 1
+                raise SandboxCrashed(f"{label} crashed its sandbox process") from e
+            except Exception:
+                healthy = True
+                raise
+            finally:
+                self._checkin(process, healthy)
+
+    def warmup(self):
+        # Process start-up (a fresh interpreter importing the pipeline) is
+        # paid here rather than by the first documents.
+        with self._lock:
+            missing = self.processes - len(self._idle)
+        for _ in range(missing):
+            self._checkin(self._spawn(), True)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for process in idle:
+            process.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "idle": len(self._idle),
+                "calls": self.calls,
+                "processes_started": self.started,
+                "processes_killed": self.killed,
+                "crashed": self.crashed,
+                "budget_exceeded": dict(self.exceeded)
+            }
+
+
+def scaled_stage_timeouts(scale: float = BUDGET_SCALE) -> Dict[str, float]:
+    return {stage: seconds * scale for stage, seconds in STAGE_TIMEOUTS.items()}
+
+
+async def within_budget(stage: str, work, timeout: Optional[float]):
+    # asyncio.timeout rather than wait_for: the stage keeps running in the
+    # caller's task, so a stage's write and the commit that follows it are
+    # never split by an event loop iteration that lets another session wait
+    # on SQLite's write lock.
+    deadline = asyncio.timeout(timeout)
+    started = time.perf_counter()
+    try:
+        async with deadline:
+            return await work
+    except TimeoutError:
+        if not deadline.expired():
+            raise
+        raise BudgetExceeded(stage, "stage_wall", timeout, time.perf_counter() - started) from None
+
+
+sandbox = Sandbox()
@@ -0,0 +1,390 @@
+import argparse
+import atexit
+import fcntl
+import glob
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from database import SessionLocal, init_db, ArchivedRecord, LineageLog
+from retention import load_archived
+
+
+# Lineage events are appended to a local, segment-rotated JSON-lines journal
+# and bulk-inserted into lineage_log by a background flusher, so audit
+# logging never adds a row (or a lock wait) to the pipeline's transactions.
+#
+# fsync policy:
+#   always - every append is fsynced before it returns (survives power loss)
+#   batch  - appends reach the OS immediately, the flusher fsyncs once per cycle
+#   never  - the OS decides when appended events reach the disk
+LINEAGE_DIR = os.environ.get("BASIRA_LINEAGE_DIR", "lineage_journal")
+LINEAGE_FSYNC = os.environ.get("BASIRA_LINEAGE_FSYNC", "batch")
+LINEAGE_SEGMENT_BYTES = int(os.environ.get("BASIRA_LINEAGE_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+LINEAGE_FLUSH_INTERVAL = float(os.environ.get("BASIRA_LINEAGE_FLUSH_INTERVAL", "1.0"))
+LINEAGE_FLUSH_BATCH = int(os.environ.get("BASIRA_LINEAGE_FLUSH_BATCH", "500"))
+
+FSYNC_POLICIES = ("always", "batch", "never")
+STAGING_GRACE_SECONDS = 60
+EVENT_FIELDS = (
+    "timestamp", "event_type", "classification_model", "extraction_model",
+    "validation_version", "execution_arn", "event_metadata"
+)
+
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:08d}.jsonl"
+
+
+def _read_segment(path: str) -> List[Dict[str, Any]]:
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-write; it was never acknowledged.
+                break
+    return events
+
+
+def _insert_events(db: Session, events: List[Dict[str, Any]]):
+    rows = [
+        {**event, "timestamp": datetime.fromisoformat(event["timestamp"])}
+        for event in events
+    ]
+    # event_id is unique, so replaying a journal whose events were partly
+    # flushed before a crash inserts only the missing ones.
+    db.execute(insert(LineageLog).on_conflict_do_nothing(index_elements=["event_id"]), rows)
+
+
+def _drop_archived(db: Session, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Retention moves old lineage_log rows into archived_records, out of
+    # reach of the event_id constraint. A journal replayed after that would
+    # insert its events a second time, so they are checked against the
+    # archive of every document that has one.
+    document_ids = {event["document_id"] for event in events}
+    archived_documents = [
+        document_id for (document_id,) in db.query(ArchivedRecord.document_id).filter(
+            ArchivedRecord.source_table == "lineage_log",
+            ArchivedRecord.document_id.in_(document_ids)
+        ).distinct()
+    ]
+    if not archived_documents:
+        return events
+    archived = {
+        row.get("event_id")
+        for document_id in archived_documents
+        for row in load_archived(db, document_id, "lineage_log")
+    }
+    return [event for event in events if event["event_id"] not in archived]
+
+
+class LineageJournal:
+
+    def __init__(self, root: str = LINEAGE_DIR, fsync: str = LINEAGE_FSYNC,
+                 segment_bytes: int = LINEAGE_SEGMENT_BYTES, flush_interval: float = LINEAGE_FLUSH_INTERVAL,
+                 flush_batch: int = LINEAGE_FLUSH_BATCH):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of: {', '.join(FSYNC_POLICIES)}")
+        self.root = root
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.directory: Optional[str] = None
+        self._lock_file = None
+        self._file = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._closed_segments: List[Tuple[str, int]] = []
+        self._seq = 0
+        self._queue: List[Dict[str, Any]] = []
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self.appended = 0
+        self.flushed = 0
+        self.recovered = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        # Each process owns one journal directory, held with an exclusive
+        # flock for its lifetime. A directory whose lock can be taken belongs
+        # to a process that died before flushing, and is replayed here.
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.root, exist_ok=True)
+            name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            # The directory is created and locked under a hidden name that
+            # recover() does not replay, then renamed into place; otherwise a
+            # sibling recovering at start-up could take it before it is locked.
+            staging = os.path.join(self.root, f".tmp-{name}")
+            os.makedirs(staging)
+            self._lock_file = open(os.path.join(staging, ".lock"), "w")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self.directory = os.path.join(self.root, name)
+            os.rename(staging, self.directory)
+            self._pid = os.getpid()
+            self._stopping = False
+            self._open_segment()
+
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name="lineage-journal-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        self._segment_number += 1
+        path = os.path.join(self.directory, _segment_name(self._segment_number))
+        self._file = open(path, "a", encoding="utf-8")
+        self._segment_size = 0
+
+    def _rotate(self):
+        self._file.flush()
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._closed_segments.append((self._file.name, self._seq))
+        self._open_segment()
+
+    def append(self, document_id: str, event_type: str, timestamp: Optional[datetime] = None,
+               classification_model: Optional[str] = None, extraction_model: Optional[str] = None,
+               validation_version: Optional[str] = None, execution_arn: Optional[str] = None,
+               event_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self._pid != os.getpid():
+            self.start()
+
+        event = {
+            "event_id": uuid.uuid4().hex,
+            "document_id": document_id,
+            "timestamp": (timestamp or datetime.utcnow()).isoformat(),
+            "event_type": event_type,
+            "classification_model": classification_model,
+            "extraction_model": extraction_model,
+            "validation_version": validation_version,
+            "execution_arn": execution_arn,
+            "event_metadata": event_metadata
+        }
+        line = json.dumps(event, separators=(",", ":"), default=str) + "\n"
+
+        with self._lock:
+            if self._segment_size >= self.segment_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            self._segment_size += len(line)
+            self._seq += 1
+            event["seq"] = self._seq
+            self._queue.append(event)
+            self._pending.setdefault(document_id, []).append(event)
+            self.appended += 1
+            backlog = len(self._queue)
+
+        if backlog >= self.flush_batch:
+            self._wake.set()
+        return event
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Events stay queued and on disk; the next cycle retries them.
+                self.last_error = str(e)
+                print(f"Lineage journal flush failed, will retry: {e}")
+
+    def flush(self) -> int:
+        # Drains everything appended so far, one transaction per flush_batch events.
+        flushed = 0
+        with self._flush_lock:
+            with self._lock:
+                if self._file is not None and self.fsync == "batch":
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                backlog = len(self._queue)
+
+            while flushed < backlog:
+                with self._lock:
+                    batch = self._queue[:min(self.flush_batch, backlog - flushed)]
+                self._flush_batch(batch)
+                flushed += len(batch)
+
+        if flushed:
+            self.last_error = None
+        return flushed
+
+    def _flush_batch(self, batch: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            _insert_events(db, [{k: v for k, v in e.items() if k != "seq"} for e in batch])
+            db.commit()
+        finally:
+            db.close()
+
+        flushed_seq = batch[-1]["seq"]
+        with self._lock:
+            del self._queue[:len(batch)]
+            for event in batch:
+                events = self._pending.get(event["document_id"])
+                if events:
+                    events.remove(event)
+                    if not events:
+                        del self._pending[event["document_id"]]
+            done = [path for path, last_seq in self._closed_segments if last_seq <= flushed_seq]
+            self._closed_segments = [s for s in self._closed_segments if s[1] > flushed_seq]
+            self.flushed += len(batch)
+        for path in done:
+            os.remove(path)
+
+    def recover(self) -> int:
+        recovered = 0
+        for directory in sorted(glob.glob(os.path.join(self.root, "*"))):
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            lock_path = os.path.join(directory, ".lock")
+            try:
+                lock_file = open(lock_path, "a")
+            except OSError:
+                continue
+            try:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+
+                events = []
+                for segment in sorted(glob.glob(os.path.join(directory, "segment-*.jsonl"))):
+                    events.extend(_read_segment(segment))
+                if events:
+                    db = SessionLocal()
+                    try:
+                        # A live flush runs seconds after the append, well
+                        # inside the retention window; only a late replay can
+                        # meet events that were already archived.
+                        replayed = _drop_archived(db, events)
+                        for i in range(0, len(replayed), self.flush_batch):
+                            _insert_events(db, replayed[i:i + self.flush_batch])
+                        db.commit()
+                    finally:
+                        db.close()
+                shutil.rmtree(directory, ignore_errors=True)
+                recovered += len(events)
+            finally:
+                lock_file.close()
+
+        # Staging directories of processes that died before renaming them
+        # hold no events. Only old ones are removed, since a fresh one may
+        # belong to a sibling that has not locked it yet.
+        for staging in glob.glob(os.path.join(self.root, ".tmp-*")):
+            try:
+                if time.time() - os.path.getmtime(staging) < STAGING_GRACE_SECONDS:
+                    continue
+                lock_file = open(os.path.join(staging, ".lock"), "a")
+            except OSError:
+                continue
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                shutil.rmtree(staging, ignore_errors=True)
+            except OSError:
+                pass
+            finally:
+                lock_file.close()
+
+        if recovered:
+            print(f"Lineage journal replayed {recovered} events left by stopped processes")
+        self.recovered += recovered
+        return recovered
+
+    def events_for(self, db: Session, document_id: str) -> List[Dict[str, Any]]:
+        # Flushed events come from lineage_log (indexed by document_id); this
+        # process's unflushed ones from memory. Other processes' unflushed
+        # events appear once their flusher runs, within one flush interval.
+        rows = db.query(LineageLog).filter(LineageLog.document_id == document_id).all()
+        events = [{"event_id": row.event_id, **{f: getattr(row, f) for f in EVENT_FIELDS}} for row in rows]
+        seen = {row.event_id for row in rows if row.event_id}
+        with self._lock:
+            pending = list(self._pending.get(document_id, []))
+        for event in pending:
+            if event["event_id"] not in seen:
+                events.append({
+                    "event_id": event["event_id"],
+                    **{f: event[f] for f in EVENT_FIELDS},
+                    "timestamp": datetime.fromisoformat(event["timestamp"])
+                })
+        events.sort(key=lambda e: e["timestamp"])
+        return [{f: e[f] for f in EVENT_FIELDS} for e in events]
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Lineage journal could not flush on shutdown, events stay in {self.directory}: {e}")
+            return
+        finally:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._pid = None
+
+        # Everything reached lineage_log, so the journal directory can go.
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._lock_file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._queue)
+            segments = len(self._closed_segments) + (1 if self._file is not None else 0)
+        return {
+            "fsync": self.fsync,
+            "appended": self.appended,
+            "flushed": self.flushed,
+            "pending": pending,
+            "segments": segments,
+            "recovered": self.recovered,
+            "last_error": self.last_error
+        }
+
+
+lineage_journal = LineageJournal()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the lineage event journal")
+    parser.add_argument("--recover", action="store_true",
+                        help="replay journals left behind by stopped processes into lineage_log")
+    args = parser.parse_args()
+
+    init_db()
+    if args.recover:
+        print(f"Replayed {lineage_journal.recover()} events")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# Open-loop load generator for the HTTP API: uploads arrive on a schedule that
+# does not wait for earlier uploads to finish, and every document is polled
+# through /api/documents/{id} until the pipeline is done with it. Standard
+# library only, so it runs on a bare node with nothing but the repo checked out.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def encode_multipart(fields: Dict[str, str], filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n".encode("utf-8")
+    )
+    parts.append(content)
+    parts.append(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def db_size(db_path: Optional[str]) -> Optional[int]:
+    if not db_path:
+        return None
+    # WAL mode keeps recent writes in the -wal file until a checkpoint.
+    return sum(
+        os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path)
+    )
+
+
+class LoadTest:
+
+    def __init__(self, base_url: str, corpus: List[str], priority: str = "standard",
+                 poll_interval: float = 0.25, timeout: float = 120.0, seed: Optional[int] = None):
+        self.base_url = base_url.rstrip("/")
+        self.files = [(os.path.basename(path), open(path, "rb").read()) for path in corpus]
+        self.priority = priority
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _request(self, path: str, data: Optional[bytes] = None,
+                 content_type: Optional[str] = None) -> Dict[str, Any]:
+        request = urllib.request.Request(self.base_url + path, data=data)
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def _track(self, index: int, results: List[Dict[str, Any]]):
+        filename, content = self.files[index % len(self.files)]
+        body, content_type = encode_multipart({"priority": self.priority}, filename, content)
+        result: Dict[str, Any] = {"file": filename, "outcome": None}
+
+        started = time.perf_counter()
+        try:
+            document_id = self._request("/api/upload", body, content_type)["document_id"]
+        except urllib.error.HTTPError as e:
+            result.update(outcome="upload_error", error=f"HTTP {e.code}")
+        except Exception as e:
+            result.update(outcome="upload_error", error=str(e))
+        result["upload_seconds"] = time.perf_counter() - started
+
+        if result["outcome"] is None:
+            deadline = started + self.timeout
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    status = self._request(f"/api/documents/{document_id}")["document"]["status"]
+                except Exception as e:
+                    result["poll_errors"] = result.get("poll_errors", 0) + 1
+                    result["error"] = str(e)
+                    status = "processing"
+                if status != "processing":
+                    result["outcome"] = status
+                    result["e2e_seconds"] = time.perf_counter() - started
+                    break
+                if time.perf_counter() > deadline:
+                    result["outcome"] = "timeout"
+                    break
+
+        with self._lock:
+            results.append(result)
+
+    def run_step(self, rate: float, duration: float, arrival: str = "poisson",
+                 db_path: Optional[str] = None) -> Dict[str, Any]:
+        results: List[Dict[str, Any]] = []
+        threads = []
+        size_before = db_size(db_path)
+
+        started = time.perf_counter()
+        next_arrival = 0.0
+        index = 0
+        while next_arrival < duration:
+            delay = started + next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # One thread per document keeps the schedule open-loop: a slow
+            # upload or a long pipeline never delays the next arrival.
+            thread = threading.Thread(target=self._track, args=(index, results), daemon=True)
+            thread.start()
+            threads.append(thread)
+            index += 1
+            next_arrival += self.random.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        offered_seconds = time.perf_counter() - started
+
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return summarize(results, rate, offered_seconds, elapsed, size_before, db_size(db_path))
+
+
+def summarize(results: List[Dict[str, Any]], rate: float, offered_seconds: float, elapsed: float,
+              size_before: Optional[int] = None, size_after: Optional[int] = None) -> Dict[str, Any]:
+    outcomes: Dict[str, int] = {}
+    for result in results:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+
+    uploads = [r["upload_seconds"] for r in results if r["outcome"] != "upload_error"]
+    e2e = [r["e2e_seconds"] for r in results if r["outcome"] == "completed"]
+    sent = len(results)
+    summary = {
+        "target_rate": rate,
+        "sent": sent,
+        "offered_rate": round(sent / offered_seconds, 3) if offered_seconds else 0.0,
+        "completed_rate": round(len(e2e) / elapsed, 3) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "error_rate": round(1 - len(e2e) / sent, 4) if sent else 0.0,
+        "poll_errors": sum(r.get("poll_errors", 0) for r in results),
+        "upload_ms": {f"p{p}": _ms(percentile(uploads, p)) for p in (50, 90, 99)},
+        "e2e_ms": {f"p{p}": _ms(percentile(e2e, p)) for p in (50, 90, 99)},
+        "elapsed_seconds": round(elapsed, 3)
+    }
+    summary["upload_ms"]["max"] = _ms(max(uploads) if uploads else None)
+    summary["e2e_ms"]["max"] = _ms(max(e2e) if e2e else None)
+    if size_before is not None and size_after is not None:
+        summary["db_bytes_before"] = size_before
+        summary["db_bytes_after"] = size_after
+        summary["db_bytes_per_document"] = round((size_after - size_before) / sent) if sent else 0
+    return summary
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class LocalServer:
+    # A throwaway API (and optionally standalone workers) on a scratch
+    # database and upload directory, so load tests never touch basira.db.
+
+    def __init__(self, worker_processes: int = 0, model_latency_scale: float = 1.0,
+                 model_server: bool = False, env: Optional[Dict[str, str]] = None):
+        self.workdir = tempfile.mkdtemp(prefix="basira-loadtest-")
+        self.db_path = os.path.join(self.workdir, "loadtest.db")
+        self.worker_processes = worker_processes
+        self.model_server = model_server
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {
+            **os.environ,
+            "BASIRA_DATABASE_URL": f"sqlite:///{self.db_path}",
+            "BASIRA_UPLOAD_DIR": os.path.join(self.workdir, "uploads"),
+            "BASIRA_LINEAGE_DIR": os.path.join(self.workdir, "lineage_journal"),
+            "BASIRA_MODEL_LATENCY_SCALE": str(model_latency_scale),
+            "BASIRA_INPROCESS_WORKER": "0" if worker_processes else "1",
+            **(env or {})
+        }
+        if model_server:
+            self.model_url = f"http://127.0.0.1:{_free_port()}"
+            self.env["BASIRA_MODEL_URL"] = self.model_url
+        self.processes: List[subprocess.Popen] = []
+
+    def __enter__(self) -> "LocalServer":
+        try:
+            self._start()
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def _start(self):
+        subprocess.run([sys.executable, "database.py"], cwd=BASE_DIR, env=self.env, check=True,
+                       stdout=subprocess.DEVNULL)
+        if self.model_server:
+            model_process = subprocess.Popen(
+                [sys.executable, "model_server.py", "--port", self.model_url.rsplit(":", 1)[1]],
+                cwd=BASE_DIR, env=self.env
+            )
+            self.processes.append(model_process)
+            _wait_until_up(self.model_url + "/healthz", model_process, "model server")
+        api_process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=BASE_DIR, env=self.env
+        )
+        self.processes.append(api_process)
+        if self.worker_processes:
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "worker.py", "--processes", str(self.worker_processes)],
+                cwd=BASE_DIR, env=self.env, stdout=subprocess.DEVNULL
+            ))
+        _wait_until_up(self.url + "/readyz", api_process, "API server")
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, name: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited during startup")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{name} was not ready after {timeout}s")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop HTTP load test of upload -> pipeline completion")
+    parser.add_argument("--url", help="test a running server instead of starting a scratch one")
+    parser.add_argument("--db", help="database file of the --url server, to report size growth")
+    parser.add_argument("--corpus", default="sample_docs", help="directory of PDFs to replay")
+    parser.add_argument("--rates", default="1", help="comma separated uploads/s, one step per rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals per step")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--priority", default="standard")
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-document completion timeout")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--worker-processes", type=int, default=0,
+                        help="scratch server only: standalone workers instead of the in-process one")
+    parser.add_argument("--model-latency-scale", type=float, default=1.0,
+                        help="scratch server only: multiplier for simulated model latency (0 disables it)")
+    parser.add_argument("--model-server", action="store_true",
+                        help="scratch server only: call models over HTTP through a local model_server.py")
+    parser.add_argument("--json", action="store_true", help="print one JSON summary per step")
+    args = parser.parse_args()
+
+    corpus = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not corpus:
+        parser.error(f"no PDF files found under {args.corpus}")
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    def run(url: str, db_path: Optional[str]):
+        load = LoadTest(url, corpus, args.priority, args.poll_interval, args.timeout, args.seed)
+        if not args.json:
+            print(f"{'rate':>6}{'sent':>6}{'done/s':>8}{'errors':>8}{'up p50':>9}{'up p99':>9}"
+                  f"{'e2e p50':>10}{'e2e p90':>10}{'e2e p99':>10}{'db KB/doc':>11}")
+        for rate in rates:
+            summary = load.run_step(rate, args.duration, args.arrival, db_path)
+            if args.json:
+                print(json.dumps(summary))
+                continue
+            per_doc = summary.get("db_bytes_per_document")
+            print(
+                f"{rate:>6g}{summary['sent']:>6}{summary['completed_rate']:>8.2f}"
+                f"{summary['error_rate']:>8.1%}{_fmt(summary['upload_ms']['p50']):>9}"
+                f"{_fmt(summary['upload_ms']['p99']):>9}{_fmt(summary['e2e_ms']['p50']):>10}"
+                f"{_fmt(summary['e2e_ms']['p90']):>10}{_fmt(summary['e2e_ms']['p99']):>10}"
+                f"{'-' if per_doc is None else f'{per_doc / 1024:.1f}':>11}"
+            )
+
+    if args.url:
+        run(args.url, args.db)
+    else:
+        with LocalServer(args.worker_processes, args.model_latency_scale, args.model_server) as server:
+            run(server.url, server.db_path)
+
+
+def _fmt(ms: Optional[float]) -> str:
+    return "-" if ms is None else f"{ms:.0f}"
+
+
+if __name__ == "__main__":
+    main()
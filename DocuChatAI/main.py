@@ -1,43 +1,204 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, Form, Query, UploadFile, HTTPException, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 import uuid
 import os
+import sys
+import time
 import asyncio
 from datetime import datetime
-from typing import List
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
 
-from database import init_db, get_db, Document, StageRun, LineageLog, MedallionData
-from models import DocumentUploadResponse, DocumentStatus, DocumentDetail, StageRunInfo, LineageInfo
-from worker import processor
+from models import (
+    DocumentUploadResponse, DocumentStatus, DocumentDetail, StageRunInfo, LineageInfo,
+    BackfillRequest, BackfillJobStatus, SearchResponse
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+# Only FastAPI and the pydantic models are imported up front. SQLAlchemy, the
+# pipeline and its PDF backends load in the startup warmup (or on first use),
+# so a new replica answers /healthz almost immediately and flips /readyz once
+# it can actually process traffic.
 
 app = FastAPI(title="Basira Document Processing Pipeline")
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = os.environ.get("BASIRA_UPLOAD_DIR", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-init_db()
+INDEX_HTML_PATH = "static/index.html"
+
+# Set BASIRA_INPROCESS_WORKER=0 when documents are processed by standalone
+# `python worker.py` processes instead of by the API itself.
+INPROCESS_WORKER = os.environ.get("BASIRA_INPROCESS_WORKER", "1") == "1"
+INPROCESS_CONCURRENCY = int(os.environ.get("BASIRA_INPROCESS_CONCURRENCY", "4"))
+
+# Set BASIRA_AUTO_MIGRATE=0 when `python database.py` runs as a deploy step;
+# replicas then only check that the schema is current before becoming ready.
+AUTO_MIGRATE = os.environ.get("BASIRA_AUTO_MIGRATE", "1") == "1"
+
+# A failed warmup (e.g. the database is not reachable yet) is retried with
+# exponential backoff up to this many seconds between attempts.
+WARMUP_RETRY_MAX_SECONDS = float(os.environ.get("BASIRA_WARMUP_RETRY_MAX_SECONDS", "60"))
+
+readiness = {"ready": False, "error": None, "warmup_seconds": None, "warmup_attempts": 0, "pdf_backend": None,
+             "model_backend": None}
+
+# The event loop only keeps weak references to tasks.
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def require_ready():
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail="Service is starting, retry shortly")
+
+
+def get_db():
+    require_ready()
+    from database import get_db as database_get_db
+    yield from database_get_db()
+
+
+def _processor():
+    from worker import processor
+    return processor
+
+
+@lru_cache(maxsize=None)
+def _backfill_engine():
+    from backfill import BackfillEngine
+    return BackfillEngine()
+
+
+@lru_cache(maxsize=None)
+def _index_html() -> str:
+    with open(INDEX_HTML_PATH, "r") as f:
+        return f.read()
+
+
+def _warm_up() -> dict:
+    import database
+    if AUTO_MIGRATE:
+        database.init_db()
+    elif not database.schema_is_current():
+        raise RuntimeError("Database schema is out of date, run `python database.py`")
+
+    # Imported for their side effect: the first request should not pay for them.
+    import worker, backfill, export, search_index, retention  # noqa: F401
+    from pipeline_stages import PipelineStages
+    from lineage_journal import lineage_journal
+
+    # Also replays journals that stopped processes did not get to flush.
+    lineage_journal.start()
+
+    details = PipelineStages.warmup()
+    _index_html()
+    return details
+
+
+async def _start_background():
+    started = time.perf_counter()
+    delay = min(1.0, WARMUP_RETRY_MAX_SECONDS)
+    while True:
+        readiness["warmup_attempts"] += 1
+        try:
+            details = await asyncio.to_thread(_warm_up)
+            break
+        except Exception as e:
+            readiness["error"] = str(e)
+            print(f"Warmup failed, retrying in {delay:g}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+    readiness.update(details)
+    readiness["error"] = None
+    readiness["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    readiness["ready"] = True
+    print(f"Basira Pipeline API ready after {readiness['warmup_seconds']}s")
+
+    from retention import RetentionManager, RETENTION_INTERVAL
+    if INPROCESS_WORKER:
+        from guardrails import sandbox
+        # Also picks up documents whose worker died mid-pipeline once their lease expires.
+        _spawn(_processor().run_forever(INPROCESS_CONCURRENCY))
+        _spawn(asyncio.to_thread(sandbox.warmup))
+    if RETENTION_INTERVAL > 0:
+        _spawn(RetentionManager().run_forever(RETENTION_INTERVAL))
 
 
 @app.on_event("startup")
 async def startup_event():
+    _spawn(_start_background())
     print("Basira Pipeline API started")
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    # Only what warmup (or a request) actually loaded is shut down; importing
+    # the pipeline here would undo the lazy start-up of a replica stopped early.
+    journal_module = sys.modules.get("lineage_journal")
+    if journal_module is not None:
+        journal_module.lineage_journal.close()
+    guardrails_module = sys.modules.get("guardrails")
+    if guardrails_module is not None:
+        guardrails_module.sandbox.close()
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    if not readiness["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "retrying" if readiness["error"] else "starting", **readiness}
+        )
+
+    from database import engine
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database_unavailable", "error": str(e)})
+    return {"status": "ready", **readiness}
+
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
-    with open("static/index.html", "r") as f:
-        return f.read()
+    return _index_html()
 
 
 @app.post("/api/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    priority: Optional[str] = Form(None),
+    tenant_id: Optional[str] = Form(None),
+    db: "Session" = Depends(get_db)
 ):
+    from database import Document
+    from scheduler import LANE_WEIGHTS, DEFAULT_LANE
+    from lineage_journal import lineage_journal
+    
+    priority = priority or DEFAULT_LANE
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    if priority not in LANE_WEIGHTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown priority '{priority}', expected one of: {', '.join(LANE_WEIGHTS)}"
+        )
     
     document_id = str(uuid.uuid4())
     file_path = os.path.join(UPLOAD_DIR, f"{document_id}_{file.filename}")
@@ -52,32 +213,40 @@ async def upload_document(
         file_path=file_path,
         upload_timestamp=datetime.utcnow(),
         current_stage="queued",
-        status="processing"
+        status="processing",
+        priority=priority,
+        tenant_id=tenant_id
     )
     db.add(document)
+    db.commit()
     
-    lineage = LineageLog(
-        document_id=document_id,
-        timestamp=datetime.utcnow(),
-        event_type="DOCUMENT_UPLOADED",
-        event_metadata={"filename": file.filename, "file_size": len(content)}
+    lineage_journal.append(
+        document_id,
+        "DOCUMENT_UPLOADED",
+        event_metadata={
+            "filename": file.filename,
+            "file_size": len(content),
+            "priority": priority,
+            "tenant_id": tenant_id
+        }
     )
-    db.add(lineage)
     
-    db.commit()
-    
-    asyncio.create_task(processor.process_document(document_id))
+    if INPROCESS_WORKER:
+        _processor().notify()
     
     return DocumentUploadResponse(
         document_id=document_id,
         filename=file.filename,
         status="processing",
+        priority=priority,
         message="Document uploaded successfully and queued for processing"
     )
 
 
 @app.get("/api/documents", response_model=List[DocumentStatus])
-async def list_documents(db: Session = Depends(get_db)):
+async def list_documents(db: "Session" = Depends(get_db)):
+    from database import Document
+    
     documents = db.query(Document).order_by(Document.upload_timestamp.desc()).all()
     
     return [
@@ -87,6 +256,8 @@ async def list_documents(db: Session = Depends(get_db)):
             current_stage=doc.current_stage,
             document_type=doc.document_type,
             status=doc.status,
+            priority=doc.priority,
+            tenant_id=doc.tenant_id,
             upload_timestamp=doc.upload_timestamp,
             error_message=doc.error_message
         )
@@ -95,18 +266,25 @@ async def list_documents(db: Session = Depends(get_db)):
 
 
 @app.get("/api/documents/{document_id}", response_model=DocumentDetail)
-async def get_document_detail(document_id: str, db: Session = Depends(get_db)):
+async def get_document_detail(document_id: str, db: "Session" = Depends(get_db)):
+    from database import Document, StageRun, MedallionData
+    from blob_store import blob_store
+    from lineage_journal import lineage_journal
+    from retention import load_archived
+    
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     stages = db.query(StageRun).filter(StageRun.document_id == document_id).order_by(StageRun.started_at).all()
-    lineage = db.query(LineageLog).filter(LineageLog.document_id == document_id).order_by(LineageLog.timestamp).all()
-    medallion = db.query(MedallionData).filter(MedallionData.document_id == document_id).all()
+    lineage = lineage_journal.events_for(db, document_id)
+    medallion = db.query(MedallionData).filter(MedallionData.document_id == document_id).order_by(MedallionData.id).all()
+    archived_stages = load_archived(db, document_id, "stage_runs")
+    archived_lineage = load_archived(db, document_id, "lineage_log")
     
     medallion_layers = {}
     for m in medallion:
-        medallion_layers[m.layer] = m.data
+        medallion_layers[m.layer] = blob_store.resolve(db, m.data)
     
     return DocumentDetail(
         document=DocumentStatus(
@@ -115,43 +293,97 @@ async def get_document_detail(document_id: str, db: Session = Depends(get_db)):
             current_stage=document.current_stage,
             document_type=document.document_type,
             status=document.status,
+            priority=document.priority,
+            tenant_id=document.tenant_id,
             upload_timestamp=document.upload_timestamp,
             error_message=document.error_message
         ),
         stages=[
+            StageRunInfo(**{**s, "output_data": blob_store.resolve(db, s["output_data"])})
+            for s in archived_stages
+        ] + [
             StageRunInfo(
                 stage_name=s.stage_name,
                 status=s.status,
                 started_at=s.started_at,
                 completed_at=s.completed_at,
-                output_data=s.output_data,
+                output_data=blob_store.resolve(db, s.output_data),
                 confidence_score=s.confidence_score,
                 error_message=s.error_message
             )
             for s in stages
         ],
-        lineage=[
-            LineageInfo(
-                timestamp=l.timestamp,
-                event_type=l.event_type,
-                classification_model=l.classification_model,
-                extraction_model=l.extraction_model,
-                validation_version=l.validation_version,
-                execution_arn=l.execution_arn,
-                event_metadata=l.event_metadata
-            )
-            for l in lineage
-        ],
+        lineage=[LineageInfo(**l) for l in archived_lineage + lineage],
         medallion_layers=medallion_layers
     )
 
 
+@app.get("/api/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1),
+    document_type: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: "Session" = Depends(get_db)
+):
+    from search_index import search_available, search_documents
+    
+    if not search_available(db):
+        raise HTTPException(status_code=503, detail="Full-text search is not available on this database")
+    
+    found = search_documents(db, q, document_type=document_type, status=status, limit=limit, offset=offset)
+    return SearchResponse(query=q, limit=limit, offset=offset, **found)
+
+
+@app.get("/api/export/{layer}", dependencies=[Depends(require_ready)])
+async def export_layer(
+    layer: str,
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    document_type: Optional[str] = None,
+    gzip: bool = False
+):
+    from export import EXPORT_FORMATS, EXPORT_LAYERS, stream_export
+    
+    if layer not in EXPORT_LAYERS:
+        raise HTTPException(status_code=400, detail=f"Layer must be one of: {', '.join(EXPORT_LAYERS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    filename = f"basira-{layer}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        stream_export(layer, format, start, end, document_type, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @app.get("/api/stats")
-async def get_stats(db: Session = Depends(get_db)):
+async def get_stats(db: "Session" = Depends(get_db)):
+    from sqlalchemy import func
+    from database import Document, StageRun
+    from model_client import model_client
+    from lineage_journal import lineage_journal
+    from guardrails import sandbox
+    
     total_docs = db.query(Document).count()
     completed_docs = db.query(Document).filter(Document.status == "completed").count()
     failed_docs = db.query(Document).filter(Document.status == "failed").count()
     processing_docs = db.query(Document).filter(Document.status == "processing").count()
+    quarantined_docs = db.query(Document).filter(Document.status == "quarantined").count()
+    quarantined_by_stage = dict(
+        db.query(StageRun.stage_name, func.count(StageRun.id))
+        .filter(StageRun.status == "budget_exceeded")
+        .group_by(StageRun.stage_name)
+        .all()
+    )
     
     doc_types = db.query(Document.document_type).distinct().all()
     doc_type_counts = {}
@@ -165,10 +397,96 @@ async def get_stats(db: Session = Depends(get_db)):
         "completed": completed_docs,
         "failed": failed_docs,
         "processing": processing_docs,
-        "document_types": doc_type_counts
+        "quarantined": quarantined_docs,
+        "document_types": doc_type_counts,
+        "guardrails": {
+            "quarantined_by_stage": quarantined_by_stage,
+            "sandbox": sandbox.stats()
+        },
+        "model_client": model_client.stats(),
+        "lineage_journal": lineage_journal.stats()
     }
 
 
+@app.get("/api/scheduler")
+async def get_scheduler_stats(window_seconds: int = 3600, db: "Session" = Depends(get_db)):
+    from scheduler import lane_report
+    
+    return {
+        "window_seconds": window_seconds,
+        "lanes": lane_report(db, window_seconds)
+    }
+
+
+@app.get("/api/archive")
+async def get_archive_partitions(db: "Session" = Depends(get_db)):
+    from retention import list_partitions
+    
+    return {"partitions": list_partitions(db)}
+
+
+@app.post("/api/backfill", response_model=BackfillJobStatus)
+async def start_backfill(request: BackfillRequest, db: "Session" = Depends(get_db)):
+    from backfill import job_progress
+    
+    try:
+        job = _backfill_engine().create_job(
+            db,
+            request.components,
+            document_type=request.document_type,
+            uploaded_after=request.uploaded_after,
+            uploaded_before=request.uploaded_before,
+            batch_size=request.batch_size,
+            concurrency=request.concurrency,
+            rate_limit=request.rate_limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    _backfill_engine().claim(db, job.id)
+    db.refresh(job)
+    _spawn(_backfill_engine().run(job.id, claimed=True))
+    return BackfillJobStatus(**job_progress(job))
+
+
+@app.get("/api/backfill", response_model=List[BackfillJobStatus])
+async def list_backfills(db: "Session" = Depends(get_db)):
+    from database import BackfillJob
+    from backfill import job_progress
+    
+    jobs = db.query(BackfillJob).order_by(BackfillJob.created_at.desc()).limit(50).all()
+    return [BackfillJobStatus(**job_progress(job)) for job in jobs]
+
+
+@app.get("/api/backfill/{job_id}", response_model=BackfillJobStatus)
+async def get_backfill(job_id: str, db: "Session" = Depends(get_db)):
+    from database import BackfillJob
+    from backfill import job_progress
+    
+    job = db.query(BackfillJob).filter(BackfillJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return BackfillJobStatus(**job_progress(job))
+
+
+@app.post("/api/backfill/{job_id}/resume", response_model=BackfillJobStatus)
+async def resume_backfill(job_id: str, db: "Session" = Depends(get_db)):
+    from database import BackfillJob
+    from backfill import job_progress
+    
+    job = db.query(BackfillJob).filter(BackfillJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=409, detail="Backfill job has already completed")
+    if not _backfill_engine().claim(db, job.id):
+        raise HTTPException(status_code=409, detail="Backfill job is already running")
+    
+    db.refresh(job)
+    _spawn(_backfill_engine().run(job.id, claimed=True))
+    return BackfillJobStatus(**job_progress(job))
+
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
@@ -0,0 +1,270 @@
+import asyncio
+import http.client
+import json
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from guardrails import BudgetExceeded
+
+
+# Empty means the in-process stand-in from model_server.py is used; point it
+# at `python model_server.py` (or a real model service speaking the same
+# batch protocol) to make network calls.
+MODEL_URL = os.environ.get("BASIRA_MODEL_URL", "")
+MODEL_BATCH_SIZE = int(os.environ.get("BASIRA_MODEL_BATCH_SIZE", "16"))
+MODEL_LINGER_MS = float(os.environ.get("BASIRA_MODEL_LINGER_MS", "10"))
+MODEL_POOL_SIZE = int(os.environ.get("BASIRA_MODEL_POOL_SIZE", "8"))
+MODEL_TIMEOUT = float(os.environ.get("BASIRA_MODEL_TIMEOUT", "30"))
+
+MODEL_TASKS = ("classify", "extract", "pii")
+
+
+class ModelServiceError(Exception):
+    pass
+
+
+class ConnectionPool:
+    # Keep-alive HTTP/1.1 connections to one model service. A connection is
+    # used by one request at a time and goes back to the idle list afterwards,
+    # so steady traffic never pays for a new TCP (or TLS) handshake.
+
+    def __init__(self, base_url: str, size: int = MODEL_POOL_SIZE, timeout: float = MODEL_TIMEOUT):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Model service URL must be http(s), got '{base_url}'")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.opened += 1
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _send(self, connection: http.client.HTTPConnection, path: str,
+              body: bytes) -> Tuple[http.client.HTTPResponse, bytes]:
+        connection.request("POST", self.base_path + path, body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response, response.read()
+
+    def post_json(self, path: str, payload: Any) -> Any:
+        body = json.dumps(payload).encode("utf-8")
+        with self._slots:
+            connection, reused = self._acquire()
+            try:
+                response, data = self._send(connection, path, body)
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused:
+                    raise
+                # The service closed an idle keep-alive connection; retry once on a new one.
+                connection = self._connect()
+                try:
+                    response, data = self._send(connection, path, body)
+                except Exception:
+                    connection.close()
+                    raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+
+        if response.status >= 400:
+            raise ModelServiceError(f"POST {path} returned {response.status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class HttpModelBackend:
+
+    def __init__(self, base_url: str, pool_size: int = MODEL_POOL_SIZE, timeout: float = MODEL_TIMEOUT):
+        self.pool = ConnectionPool(base_url, pool_size, timeout)
+
+    async def infer(self, task: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        try:
+            response = await asyncio.to_thread(self.pool.post_json, f"/v1/{task}", {"items": items})
+        except ModelServiceError:
+            raise
+        except Exception as e:
+            raise ModelServiceError(f"Model service call '{task}' failed: {e}") from e
+        results = response.get("results")
+        if not isinstance(results, list) or len(results) != len(items):
+            raise ModelServiceError(f"Model service returned a malformed '{task}' batch")
+        return [self._decode(task, result) for result in results]
+
+    @staticmethod
+    def _decode(task: str, result: Any) -> Any:
+        if isinstance(result, dict) and "error" in result:
+            if result.get("budget_exceeded"):
+                return BudgetExceeded(**result["budget"])
+            return ModelServiceError(f"Model service call '{task}' failed: {result['error']}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"url": f"{self.pool.scheme}://{self.pool.host}:{self.pool.port}{self.pool.base_path}",
+                "connections_opened": self.pool.opened, "connections_reused": self.pool.reused}
+
+
+class MicroBatcher:
+    # Collects concurrent single-item requests for one task and sends them as
+    # one batch when max_batch_size items are waiting or the oldest has waited
+    # linger_ms, whichever comes first.
+
+    def __init__(self, call_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = MODEL_BATCH_SIZE, linger_ms: float = MODEL_LINGER_MS):
+        self.call_batch = call_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.linger = max(0.0, linger_ms) / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _bind(self, loop: asyncio.AbstractEventLoop):
+        # Futures belong to one event loop; a new loop (asyncio.run in a CLI
+        # or test) starts with a clean queue.
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+            self._tasks = set()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        self._bind(loop)
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush(partial=False)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._on_linger)
+        return await future
+
+    def _on_linger(self):
+        self._timer = None
+        self._flush(partial=True)
+
+    def _flush(self, partial: bool):
+        while len(self._pending) >= self.max_batch_size or (partial and self._pending):
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            task = self._loop.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if self._pending and self._timer is None:
+            self._timer = self._loop.call_later(self.linger, self._on_linger)
+        elif not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = await self.call_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            # A backend reports a failed item as an exception in its place;
+            # only that item's caller sees it.
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch
+        }
+
+
+class ModelClient:
+
+    def __init__(self, base_url: Optional[str] = None, batch_size: int = MODEL_BATCH_SIZE,
+                 linger_ms: float = MODEL_LINGER_MS, pool_size: int = MODEL_POOL_SIZE,
+                 timeout: float = MODEL_TIMEOUT):
+        self.base_url = MODEL_URL if base_url is None else base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._backend = None
+        self._batchers = {
+            task: MicroBatcher(self._caller(task), batch_size, linger_ms) for task in MODEL_TASKS
+        }
+
+    @property
+    def backend(self):
+        # Built on first use: the in-process stand-in imports the pipeline's
+        # model functions, which themselves import this module.
+        if self._backend is None:
+            if self.base_url:
+                self._backend = HttpModelBackend(self.base_url, self.pool_size, self.timeout)
+            else:
+                from model_server import LocalModelBackend
+                self._backend = LocalModelBackend()
+        return self._backend
+
+    def warmup(self) -> str:
+        # Builds the backend ahead of the first document; for the local
+        # stand-in that includes importing the pipeline's model functions.
+        return self.backend.stats()["url"] or "local"
+
+    def _caller(self, task: str) -> Callable[[List[Any]], Awaitable[List[Any]]]:
+        async def call(items: List[Any]) -> List[Any]:
+            return await self.backend.infer(task, items)
+        return call
+
+    async def classify(self, text: str) -> Dict[str, Any]:
+        return await self._batchers["classify"].submit({"text": text})
+
+    async def extract(self, text: str, document_type: str) -> Dict[str, Any]:
+        return await self._batchers["extract"].submit({"text": text, "document_type": document_type})
+
+    async def detect_pii(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._batchers["pii"].submit({"data": data})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.stats(),
+            "tasks": {task: batcher.stats() for task, batcher in self._batchers.items()}
+        }
+
+
+model_client = ModelClient()
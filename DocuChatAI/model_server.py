@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import os
+from typing import Any, Dict, List
+
+from guardrails import BudgetExceeded, SandboxCrashed, sandbox
+from pipeline_stages import PipelineStages
+
+
+# Local stand-in for the remote classification / extraction / PII model
+# services. Every call costs a fixed round trip plus a small per-item cost,
+# which is what makes batching pay off against the real services too.
+MODEL_LATENCY_SCALE = float(os.environ.get("BASIRA_MODEL_LATENCY_SCALE", "1.0"))
+MODEL_PER_ITEM_MS = float(os.environ.get("BASIRA_MODEL_PER_ITEM_MS", "5"))
+
+
+def _classify(item: Dict[str, Any]) -> Dict[str, Any]:
+    return PipelineStages.classify_text(item["text"])
+
+
+def _extract(item: Dict[str, Any]) -> Dict[str, Any]:
+    return PipelineStages.extract_fields(item["text"], item["document_type"])
+
+
+def _redact(item: Dict[str, Any]) -> Dict[str, Any]:
+    return PipelineStages.redact_pii(item["data"])
+
+
+# Task -> (seconds per call, input fields, model function for one item)
+MODELS: Dict[str, tuple] = {
+    "classify": (0.5, ("text",), _classify),
+    "extract": (0.8, ("text", "document_type"), _extract),
+    "pii": (0.3, ("data",), _redact)
+}
+
+
+def batch_latency(task: str, size: int) -> float:
+    return (MODELS[task][0] + size * MODEL_PER_ITEM_MS / 1000.0) * MODEL_LATENCY_SCALE
+
+
+async def infer_batch(task: str, items: List[Dict[str, Any]]) -> List[Any]:
+    if task not in MODELS:
+        raise KeyError(task)
+    _, fields, model = MODELS[task]
+    for item in items:
+        missing = [field for field in fields if field not in item]
+        if missing:
+            raise KeyError(missing[0])
+
+    await asyncio.sleep(batch_latency(task, len(items)))
+    # The batch is one sandboxed call and each item has its own CPU budget,
+    # so a pathological document exceeds its budget alone; the rest of the
+    # batch still gets results. Failed items come back as exception
+    # instances in their position.
+    try:
+        return await sandbox.run_batch(task, model, items)
+    except (BudgetExceeded, SandboxCrashed):
+        # Something blocked past the whole batch's wall budget or killed the
+        # process; rerun the items apart so only the culprit is charged.
+        return await asyncio.gather(*(sandbox.run(task, model, item) for item in items), return_exceptions=True)
+
+
+def encode_result(result: Any) -> Dict[str, Any]:
+    if isinstance(result, BudgetExceeded):
+        return {"error": str(result), "budget_exceeded": True, "budget": result.details()}
+    if isinstance(result, Exception):
+        return {"error": str(result), "budget_exceeded": False}
+    return result
+
+
+class LocalModelBackend:
+    # What model_client uses when BASIRA_MODEL_URL is not set: the same
+    # models and latency, without the network hop.
+
+    def __init__(self):
+        self.calls = 0
+
+    async def infer(self, task: str, items: List[Dict[str, Any]]) -> List[Any]:
+        self.calls += 1
+        return await infer_batch(task, items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"url": None, "calls": self.calls}
+
+
+def create_app():
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class BatchRequest(BaseModel):
+        items: List[Dict[str, Any]]
+
+    app = FastAPI(title="Basira model service stand-in")
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
+
+    @app.post("/v1/{task}")
+    async def infer(task: str, request: BatchRequest):
+        if task not in MODELS:
+            raise HTTPException(status_code=404, detail=f"Unknown model task '{task}', expected one of: {', '.join(MODELS)}")
+        try:
+            results = await infer_batch(task, request.items)
+        except KeyError as e:
+            raise HTTPException(status_code=422, detail=f"Missing input field {e}")
+        return {"task": task, "results": [encode_result(result) for result in results]}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local model service stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ class DocumentUploadResponse(BaseModel):
     document_id: str
     filename: str
     status: str
+    priority: str
     message: str
 
 
@@ -16,6 +17,8 @@ class DocumentStatus(BaseModel):
     current_stage: str
     document_type: Optional[str]
     status: str
+    priority: Optional[str] = None
+    tenant_id: Optional[str] = None
     upload_timestamp: datetime
     error_message: Optional[str]
 
@@ -45,3 +48,52 @@ class DocumentDetail(BaseModel):
     stages: List[StageRunInfo]
     lineage: List[LineageInfo]
     medallion_layers: Dict[str, Any]
+
+
+class BackfillRequest(BaseModel):
+    components: List[str]
+    document_type: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    batch_size: int = 200
+    concurrency: int = 8
+    rate_limit: Optional[float] = None
+
+
+class BackfillJobStatus(BaseModel):
+    job_id: str
+    status: str
+    components: List[str]
+    document_type: Optional[str]
+    uploaded_after: Optional[datetime]
+    uploaded_before: Optional[datetime]
+    total: int
+    processed: int
+    succeeded: int
+    failed: int
+    skipped: int
+    remaining: int
+    elapsed_seconds: float
+    throughput_per_second: float
+    eta_seconds: Optional[float]
+    created_at: datetime
+    finished_at: Optional[datetime]
+    last_error: Optional[str]
+
+
+class SearchResult(BaseModel):
+    document_id: str
+    filename: str
+    document_type: Optional[str]
+    status: str
+    upload_timestamp: datetime
+    score: float
+    snippet: Optional[str]
+
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    results: List[SearchResult]
@@ -0,0 +1,277 @@
+import argparse
+import difflib
+import glob
+import importlib.util
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# pypdfium2 is the fastest backend, so it goes first whenever the `pdfium`
+# extra is installed; otherwise PyPDF2 stays ahead of the slower pdfminer.
+PDF_BACKENDS = os.environ.get(
+    "BASIRA_PDF_BACKENDS",
+    "pypdfium2,pdfminer,pypdf2" if importlib.util.find_spec("pypdfium2") else "pypdf2,pdfminer"
+)
+PDF_TEXT_CACHE_SIZE = int(os.environ.get("BASIRA_PDF_TEXT_CACHE_SIZE", "128"))
+
+
+class PdfExtractionError(Exception):
+    pass
+
+
+class PdfBackend:
+    name = ""
+    module = ""
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def extract_pages(self, file_path: str) -> List[str]:
+        raise NotImplementedError
+
+
+class PyPDF2Backend(PdfBackend):
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def extract_pages(self, file_path: str) -> List[str]:
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(file_path)
+        return [page.extract_text() or "" for page in reader.pages]
+
+
+class PdfiumBackend(PdfBackend):
+    name = "pypdfium2"
+    module = "pypdfium2"
+
+    def extract_pages(self, file_path: str) -> List[str]:
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(file_path)
+        try:
+            pages = []
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+class PdfMinerBackend(PdfBackend):
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def extract_pages(self, file_path: str) -> List[str]:
+        from pdfminer.high_level import extract_text
+
+        pages = extract_text(file_path).split("\f")
+        # pdfminer ends the last page with a form feed as well.
+        if len(pages) > 1 and not pages[-1].strip():
+            pages.pop()
+        return pages
+
+
+BACKENDS: Dict[str, PdfBackend] = {
+    backend.name: backend for backend in (PyPDF2Backend(), PdfiumBackend(), PdfMinerBackend())
+}
+
+
+def normalize_pages(pages: Sequence[str]) -> str:
+    # Every backend's output is reduced to the same shape: '\n' line endings,
+    # no trailing spaces and one '\n' after each page, as PyPDF2 was used.
+    normalized = []
+    for page in pages:
+        page = page.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+        normalized.append("\n".join(line.rstrip() for line in page.split("\n")) + "\n")
+    return "".join(normalized)
+
+
+class PdfTextExtractor:
+
+    def __init__(self, backend_names: Optional[Sequence[str]] = None, cache_size: int = PDF_TEXT_CACHE_SIZE):
+        names = backend_names or [name.strip() for name in PDF_BACKENDS.split(",") if name.strip()]
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise ValueError(f"Unknown PDF backends {unknown}, expected some of: {', '.join(BACKENDS)}")
+        self.backends = [BACKENDS[name] for name in names]
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(file_path: str) -> tuple:
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+    def cached(self, file_path: str) -> Optional[Tuple[str, str]]:
+        try:
+            key = self._cache_key(file_path)
+        except OSError as e:
+            raise PdfExtractionError(f"Cannot read {file_path}: {e}") from e
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+            return cached
+
+    def remember(self, file_path: str, result: Tuple[str, str]):
+        key = self._cache_key(file_path)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def extract_uncached(self, file_path: str) -> Tuple[str, str]:
+        errors = []
+        for backend in self.backends:
+            if not backend.available():
+                continue
+            try:
+                return backend.name, normalize_pages(backend.extract_pages(file_path))
+            except Exception as e:
+                errors.append(f"{backend.name}: {e}")
+
+        if not errors:
+            raise PdfExtractionError(
+                f"No PDF backend available, install one of: {', '.join(b.module for b in self.backends)}"
+            )
+        raise PdfExtractionError(f"Could not extract text from {os.path.basename(file_path)} ({'; '.join(errors)})")
+
+    def extract(self, file_path: str) -> Tuple[str, str]:
+        cached = self.cached(file_path)
+        if cached is not None:
+            return cached
+        result = self.extract_uncached(file_path)
+        self.remember(file_path, result)
+        return result
+
+    def extract_text(self, file_path: str) -> str:
+        return self.extract(file_path)[1]
+
+    def warmup(self) -> Optional[str]:
+        # Backends import their library on first use; doing it here moves
+        # that cost out of the first document's classify stage.
+        for backend in self.backends:
+            if backend.available():
+                importlib.import_module(backend.module)
+                return backend.name
+        return None
+
+
+text_extractor = PdfTextExtractor()
+
+
+def _benchmark_backend(name: str, files: List[str], repeat: int) -> Dict[str, object]:
+    backend = BACKENDS[name]
+    texts = {}
+    pages = 0
+    failures = 0
+    started = time.perf_counter()
+    for run in range(repeat):
+        for file_path in files:
+            try:
+                extracted = backend.extract_pages(file_path)
+            except Exception:
+                failures += 1
+                continue
+            pages += len(extracted)
+            if run == 0:
+                texts[file_path] = normalize_pages(extracted)
+    elapsed = time.perf_counter() - started
+
+    # tracemalloc hooks every Python allocation, which slows pure-Python
+    # backends far more than native ones, so memory gets a pass of its own.
+    tracemalloc.start()
+    for file_path in files:
+        try:
+            backend.extract_pages(file_path)
+        except Exception:
+            pass
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "backend": name,
+        "pages": pages,
+        "seconds": elapsed,
+        "failures": failures,
+        "python_peak_mb": python_peak / (1024 * 1024),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "texts": texts
+    }
+
+
+def _agreement(reference: Dict[str, str], candidate: Dict[str, str]) -> float:
+    ratios = []
+    for file_path, expected in reference.items():
+        actual = candidate.get(file_path)
+        if actual is None:
+            ratios.append(0.0)
+            continue
+        ratios.append(difflib.SequenceMatcher(None, expected.split(), actual.split(), autojunk=False).ratio())
+    return sum(ratios) / len(ratios) if ratios else 0.0
+
+
+def benchmark(corpus: str, repeat: int = 3, backend_names: Optional[Sequence[str]] = None) -> List[Dict[str, object]]:
+    files = sorted(glob.glob(os.path.join(corpus, "**", "*.pdf"), recursive=True))
+    if not files:
+        raise PdfExtractionError(f"No PDF files found under {corpus}")
+
+    names = [name for name in (backend_names or BACKENDS) if BACKENDS[name].available()]
+    results = []
+    # Each backend runs in a fresh process so peak RSS belongs to it alone.
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results.append(pool.submit(_benchmark_backend, name, files, repeat).result())
+
+    reference = results[0]["texts"] if results else {}
+    for result in results:
+        result["pages_per_second"] = result["pages"] / result["seconds"] if result["seconds"] else 0.0
+        result["agreement"] = _agreement(reference, result.pop("texts"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF text extraction backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench = subparsers.add_parser("benchmark", help="compare backends over a corpus of PDFs")
+    bench.add_argument("corpus", nargs="?", default="sample_docs")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--backend", action="append", choices=list(BACKENDS),
+                       help="limit to these backends; the first is the agreement reference")
+
+    extract = subparsers.add_parser("extract", help="print the text the configured backends produce")
+    extract.add_argument("file")
+
+    args = parser.parse_args()
+    if args.command == "extract":
+        backend, text = text_extractor.extract(args.file)
+        print(f"[{backend}]")
+        print(text)
+        return
+
+    results = benchmark(args.corpus, args.repeat, args.backend)
+    print(f"{'backend':<12}{'pages/s':>10}{'py peak MB':>12}{'peak RSS MB':>13}{'agreement':>11}{'failures':>10}")
+    for result in results:
+        print(
+            f"{result['backend']:<12}{result['pages_per_second']:>10.1f}{result['python_peak_mb']:>12.2f}"
+            f"{result['peak_rss_mb']:>13.1f}{result['agreement']:>11.3f}{result['failures']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import re
-import asyncio
 import random
 from typing import Dict, Any, Tuple, List
 from datetime import datetime
-from PyPDF2 import PdfReader
+from pdf_backends import text_extractor
+from validation_rules import rule_engine
+from model_client import model_client
+from guardrails import BudgetExceeded, sandbox
 import json
 
 
@@ -13,51 +15,122 @@ class PipelineStages:
     EXTRACTION_MODEL = "textract-analyze-v3.0"
     VALIDATION_VERSION = "v2.1-business-rules"
     
+    DOCUMENT_KEYWORDS = {
+        "INVOICE": ("invoice", "bill", "amount due", "total", "vendor", "payment"),
+        "NATIONAL_ID": ("national id", "identity card", "id number", "date of birth", "nationality"),
+        "BANK_STATEMENT": ("bank statement", "account", "balance", "transaction", "deposit", "withdrawal"),
+        "PAYSLIP": ("payslip", "salary", "earnings", "deductions", "net pay", "gross pay"),
+        "UTILITY_BILL": ("utility", "electricity", "water", "gas", "meter reading")
+    }
+    
+    PII_PATTERNS = {
+        "email": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+        "phone": re.compile(r'\b(?:\+966|00966|0)?[5]\d{8}\b'),
+        "national_id": re.compile(r'\b[12]\d{9}\b'),
+        "credit_card": re.compile(r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b'),
+        "iban": re.compile(r'\b[A-Z]{2}\d{2}[A-Z0-9]{1,30}\b')
+    }
+    
+    FIELD_PATTERNS = {
+        "invoice_number": re.compile(r'invoice\s*(?:#|number|no\.?)?\s*:?\s*([A-Z0-9-]+)', re.IGNORECASE),
+        "invoice_total": re.compile(r'(?:total|amount due|grand total)\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', re.IGNORECASE),
+        "vendor_name": re.compile(r'(?:from|vendor|seller|company)\s*:?\s*([A-Za-z\s&]+)', re.IGNORECASE),
+        "id_number": re.compile(r'(?:id|identity)\s*(?:number|no\.?)?\s*:?\s*(\d{10})', re.IGNORECASE),
+        "name": re.compile(r'name\s*:?\s*([A-Za-z\s]+)', re.IGNORECASE),
+        "account_number": re.compile(r'account\s*(?:number|no\.?)?\s*:?\s*([A-Z0-9]+)', re.IGNORECASE),
+        "closing_balance": re.compile(r'(?:closing|final)\s*balance\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', re.IGNORECASE),
+        "net_salary": re.compile(r'(?:net pay|net salary)\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', re.IGNORECASE)
+    }
+    
     @staticmethod
-    async def classify_document(file_path: str) -> Tuple[str, Dict[str, Any], float]:
-        await asyncio.sleep(0.5)
-        
-        keywords = {
-            "INVOICE": ["invoice", "bill", "amount due", "total", "vendor", "payment"],
-            "NATIONAL_ID": ["national id", "identity card", "id number", "date of birth", "nationality"],
-            "BANK_STATEMENT": ["bank statement", "account", "balance", "transaction", "deposit", "withdrawal"],
-            "PAYSLIP": ["payslip", "salary", "earnings", "deductions", "net pay", "gross pay"],
-            "UTILITY_BILL": ["utility", "electricity", "water", "gas", "meter reading"]
+    def warmup() -> Dict[str, Any]:
+        # Runs every extractor and the redaction patterns once and imports the
+        # first available PDF backend, so the first real document does not pay
+        # for lazy initialisation inside the pipeline.
+        sample = "Invoice #W-1 Total: 1.00 Vendor: Warmup ID number: 1000000000 Name: W Account: A1 Net pay: 1"
+        for extract in (
+            PipelineStages._extract_invoice_data,
+            PipelineStages._extract_id_data,
+            PipelineStages._extract_bank_statement_data,
+            PipelineStages._extract_payslip_data
+        ):
+            extract(sample)
+        for pattern in PipelineStages.PII_PATTERNS.values():
+            pattern.sub("", sample)
+        PipelineStages._score_keywords(sample.lower())
+        rule_engine.evaluate({}, "INVOICE")
+        return {"pdf_backend": text_extractor.warmup(), "model_backend": model_client.warmup()}
+    
+    @staticmethod
+    def _score_keywords(text: str) -> Dict[str, int]:
+        return {
+            doc_type: sum(1 for keyword in keywords if keyword in text)
+            for doc_type, keywords in PipelineStages.DOCUMENT_KEYWORDS.items()
         }
-        
+    
+    @staticmethod
+    async def classify_document(file_path: str) -> Tuple[str, Dict[str, Any], float]:
         try:
-            text = PipelineStages._extract_text_from_pdf(file_path).lower()
-            
-            scores = {}
-            for doc_type, keywords_list in keywords.items():
-                score = sum(1 for keyword in keywords_list if keyword in text)
-                scores[doc_type] = score
-            
-            if max(scores.values()) == 0:
-                doc_type = "UNKNOWN"
-                confidence = 0.3
-            else:
-                doc_type = max(scores, key=scores.get)
-                confidence = min(0.95, 0.6 + (scores[doc_type] * 0.07))
-            
-            output = {
-                "document_type": doc_type,
-                "confidence": confidence,
-                "scores": scores,
-                "model_version": PipelineStages.CLASSIFICATION_MODEL
-            }
-            
-            return doc_type, output, confidence
-            
+            text = await PipelineStages._extract_text_from_pdf(file_path)
+        except BudgetExceeded:
+            raise
         except Exception as e:
             return "UNKNOWN", {"error": str(e)}, 0.0
+        
+        result = await model_client.classify(text)
+        doc_type = result["document_type"]
+        confidence = result["confidence"]
+        
+        output = {
+            "document_type": doc_type,
+            "confidence": confidence,
+            "scores": result["scores"],
+            "model_version": PipelineStages.CLASSIFICATION_MODEL
+        }
+        
+        return doc_type, output, confidence
     
     @staticmethod
     async def extract_data(file_path: str, document_type: str) -> Tuple[Dict[str, Any], float]:
-        await asyncio.sleep(0.8)
+        text = await PipelineStages._extract_text_from_pdf(file_path)
         
-        text = PipelineStages._extract_text_from_pdf(file_path)
+        result = await model_client.extract(text, document_type)
+        extracted = result["fields"]
+        extracted["model_version"] = PipelineStages.EXTRACTION_MODEL
+        extracted["extraction_timestamp"] = datetime.utcnow().isoformat()
+        
+        return extracted, result["confidence"]
+    
+    @staticmethod
+    async def detect_and_redact_pii(data: Dict[str, Any]) -> Dict[str, Any]:
+        result = await model_client.detect_pii(data)
         
+        return {
+            "redacted_data": result["redacted_data"],
+            "pii_detected": result["pii_detected"],
+            "pii_detection_model": "aws-comprehend-pii-v2.0",
+            "redaction_timestamp": datetime.utcnow().isoformat()
+        }
+    
+    # The three methods below are the model logic itself. They run behind the
+    # model service (model_server.py, or its in-process stand-in), batched by
+    # model_client, never directly from a pipeline stage.
+    
+    @staticmethod
+    def classify_text(text: str) -> Dict[str, Any]:
+        scores = PipelineStages._score_keywords(text.lower())
+        
+        if max(scores.values()) == 0:
+            doc_type = "UNKNOWN"
+            confidence = 0.3
+        else:
+            doc_type = max(scores, key=scores.get)
+            confidence = min(0.95, 0.6 + (scores[doc_type] * 0.07))
+        
+        return {"document_type": doc_type, "confidence": confidence, "scores": scores}
+    
+    @staticmethod
+    def extract_fields(text: str, document_type: str) -> Dict[str, Any]:
         if document_type == "INVOICE":
             extracted = PipelineStages._extract_invoice_data(text)
         elif document_type == "NATIONAL_ID":
@@ -69,24 +142,10 @@ class PipelineStages:
         else:
             extracted = {"raw_text": text[:500], "extracted_fields": {}}
         
-        confidence = 0.85 + random.uniform(-0.1, 0.1)
-        extracted["model_version"] = PipelineStages.EXTRACTION_MODEL
-        extracted["extraction_timestamp"] = datetime.utcnow().isoformat()
-        
-        return extracted, confidence
+        return {"fields": extracted, "confidence": 0.85 + random.uniform(-0.1, 0.1)}
     
     @staticmethod
-    async def detect_and_redact_pii(data: Dict[str, Any]) -> Dict[str, Any]:
-        await asyncio.sleep(0.3)
-        
-        pii_patterns = {
-            "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            "phone": r'\b(?:\+966|00966|0)?[5]\d{8}\b',
-            "national_id": r'\b[12]\d{9}\b',
-            "credit_card": r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b',
-            "iban": r'\b[A-Z]{2}\d{2}[A-Z0-9]{1,30}\b'
-        }
-        
+    def redact_pii(data: Dict[str, Any]) -> Dict[str, Any]:
         redacted_data = json.loads(json.dumps(data))
         pii_detected = []
         
@@ -99,8 +158,8 @@ class PipelineStages:
                     redact_recursive(item, obj, i, f"{path}[{i}]")
             elif isinstance(obj, str):
                 redacted_value = obj
-                for pii_type, pattern in pii_patterns.items():
-                    matches = re.findall(pattern, redacted_value)
+                for pii_type, pattern in PipelineStages.PII_PATTERNS.items():
+                    matches = pattern.findall(redacted_value)
                     if matches:
                         for match in matches:
                             pii_detected.append({
@@ -108,77 +167,36 @@ class PipelineStages:
                                 "location": path,
                                 "redacted": True
                             })
-                        redacted_value = re.sub(pattern, f"[REDACTED-{pii_type.upper()}]", redacted_value)
+                        redacted_value = pattern.sub(f"[REDACTED-{pii_type.upper()}]", redacted_value)
                 
                 if redacted_value != obj and parent is not None and key is not None:
                     parent[key] = redacted_value
         
         redact_recursive(redacted_data)
         
-        return {
-            "redacted_data": redacted_data,
-            "pii_detected": pii_detected,
-            "pii_detection_model": "aws-comprehend-pii-v2.0",
-            "redaction_timestamp": datetime.utcnow().isoformat()
-        }
+        return {"redacted_data": redacted_data, "pii_detected": pii_detected}
     
     @staticmethod
     async def validate_data(data: Dict[str, Any], document_type: str) -> Tuple[bool, List[str], List[str]]:
-        await asyncio.sleep(0.4)
-        
-        passed_rules = []
-        failed_rules = []
-        
-        if document_type == "INVOICE":
-            if data.get("total_amount") and isinstance(data.get("total_amount"), (int, float)):
-                passed_rules.append("total_amount_present")
-            else:
-                failed_rules.append("total_amount_missing_or_invalid")
-            
-            if data.get("vendor_name"):
-                passed_rules.append("vendor_name_present")
-            else:
-                failed_rules.append("vendor_name_missing")
-            
-            if data.get("invoice_number"):
-                passed_rules.append("invoice_number_present")
-            else:
-                failed_rules.append("invoice_number_missing")
-                
-        elif document_type == "NATIONAL_ID":
-            if data.get("id_number"):
-                passed_rules.append("id_number_present")
-            else:
-                failed_rules.append("id_number_missing")
-            
-            if data.get("name"):
-                passed_rules.append("name_present")
-            else:
-                failed_rules.append("name_missing")
-                
-        elif document_type == "BANK_STATEMENT":
-            if data.get("account_number"):
-                passed_rules.append("account_number_present")
-            else:
-                failed_rules.append("account_number_missing")
-        
-        if not failed_rules:
-            passed_rules.append("all_mandatory_fields_present")
-        
-        is_valid = len(failed_rules) == 0
-        
-        return is_valid, passed_rules, failed_rules
+        return rule_engine.evaluate(data, document_type)
     
     @staticmethod
-    def _extract_text_from_pdf(file_path: str) -> str:
-        try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        except Exception as e:
-            return f"Error extracting text: {str(e)}"
+    def validate_batch(records: List[Dict[str, Any]], document_types: List[str]) -> List[Tuple[bool, List[str], List[str]]]:
+        return rule_engine.evaluate_many(records, document_types)
+    
+    @staticmethod
+    async def _extract_text_from_pdf(file_path: str) -> str:
+        # Parsing runs in a sandbox process under the pdf_text budget. The
+        # result is cached here, so classify and extract parse a file once.
+        result = text_extractor.cached(file_path)
+        if result is None:
+            result = await sandbox.run("pdf_text", PipelineStages._parse_pdf, file_path)
+            text_extractor.remember(file_path, result)
+        return result[1]
+    
+    @staticmethod
+    def _parse_pdf(file_path: str) -> Tuple[str, str]:
+        return text_extractor.extract_uncached(file_path)
     
     @staticmethod
     def _extract_invoice_data(text: str) -> Dict[str, Any]:
@@ -192,15 +210,15 @@ class PipelineStages:
             "line_items": []
         }
         
-        invoice_match = re.search(r'invoice\s*(?:#|number|no\.?)?\s*:?\s*([A-Z0-9-]+)', text, re.IGNORECASE)
+        invoice_match = PipelineStages.FIELD_PATTERNS["invoice_number"].search(text)
         if invoice_match:
             invoice_data["invoice_number"] = invoice_match.group(1)
         
-        amount_match = re.search(r'(?:total|amount due|grand total)\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', text, re.IGNORECASE)
+        amount_match = PipelineStages.FIELD_PATTERNS["invoice_total"].search(text)
         if amount_match:
             invoice_data["total_amount"] = float(amount_match.group(1).replace(',', ''))
         
-        vendor_match = re.search(r'(?:from|vendor|seller|company)\s*:?\s*([A-Za-z\s&]+)', text, re.IGNORECASE)
+        vendor_match = PipelineStages.FIELD_PATTERNS["vendor_name"].search(text)
         if vendor_match:
             invoice_data["vendor_name"] = vendor_match.group(1).strip()
         
@@ -216,11 +234,11 @@ class PipelineStages:
             "gender": None
         }
         
-        id_match = re.search(r'(?:id|identity)\s*(?:number|no\.?)?\s*:?\s*(\d{10})', text, re.IGNORECASE)
+        id_match = PipelineStages.FIELD_PATTERNS["id_number"].search(text)
         if id_match:
             id_data["id_number"] = id_match.group(1)
         
-        name_match = re.search(r'name\s*:?\s*([A-Za-z\s]+)', text, re.IGNORECASE)
+        name_match = PipelineStages.FIELD_PATTERNS["name"].search(text)
         if name_match:
             id_data["name"] = name_match.group(1).strip()
         
@@ -237,11 +255,11 @@ class PipelineStages:
             "transactions": []
         }
         
-        account_match = re.search(r'account\s*(?:number|no\.?)?\s*:?\s*([A-Z0-9]+)', text, re.IGNORECASE)
+        account_match = PipelineStages.FIELD_PATTERNS["account_number"].search(text)
         if account_match:
             statement_data["account_number"] = account_match.group(1)
         
-        balance_match = re.search(r'(?:closing|final)\s*balance\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', text, re.IGNORECASE)
+        balance_match = PipelineStages.FIELD_PATTERNS["closing_balance"].search(text)
         if balance_match:
             statement_data["closing_balance"] = float(balance_match.group(1).replace(',', ''))
         
@@ -258,7 +276,7 @@ class PipelineStages:
             "deductions": []
         }
         
-        salary_match = re.search(r'(?:net pay|net salary)\s*:?\s*(?:SAR|SR|$)?\s*([\d,]+\.?\d*)', text, re.IGNORECASE)
+        salary_match = PipelineStages.FIELD_PATTERNS["net_salary"].search(text)
         if salary_match:
             payslip_data["net_salary"] = float(salary_match.group(1).replace(',', ''))
         
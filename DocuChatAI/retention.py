@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from sqlalchemy import delete, func, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine, init_db, ArchivedRecord, Document, LineageLog, StageRun
+
+
+RETENTION_DAYS = int(os.environ.get("BASIRA_RETENTION_DAYS", "30"))
+RETENTION_INTERVAL = int(os.environ.get("BASIRA_RETENTION_INTERVAL", "3600"))
+ARCHIVE_BATCH_DOCUMENTS = 100
+VACUUM_STEP_PAGES = 256
+
+ARCHIVED_TABLES = {
+    "stage_runs": (StageRun, StageRun.started_at),
+    "lineage_log": (LineageLog, LineageLog.timestamp)
+}
+DATETIME_FIELDS = {
+    "stage_runs": ("started_at", "completed_at"),
+    "lineage_log": ("timestamp",)
+}
+
+
+def partition_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m")
+
+
+def _encode_rows(rows: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(rows, default=str).encode("utf-8"), 6)
+
+
+def _decode_rows(source_table: str, payload: bytes) -> List[Dict[str, Any]]:
+    rows = json.loads(zlib.decompress(payload).decode("utf-8"))
+    for row in rows:
+        for field in DATETIME_FIELDS[source_table]:
+            if row.get(field):
+                row[field] = datetime.fromisoformat(row[field])
+    return rows
+
+
+def load_archived(db: Session, document_id: str, source_table: str) -> List[Dict[str, Any]]:
+    records = db.query(ArchivedRecord).filter(
+        ArchivedRecord.document_id == document_id,
+        ArchivedRecord.source_table == source_table
+    ).order_by(ArchivedRecord.partition_key).all()
+
+    rows = []
+    for record in records:
+        rows.extend(_decode_rows(source_table, record.payload))
+    return rows
+
+
+def list_partitions(db: Session) -> List[Dict[str, Any]]:
+    partitions = db.query(
+        ArchivedRecord.partition_key,
+        ArchivedRecord.source_table,
+        func.count(func.distinct(ArchivedRecord.document_id)),
+        func.sum(ArchivedRecord.record_count),
+        func.sum(func.length(ArchivedRecord.payload))
+    ).group_by(ArchivedRecord.partition_key, ArchivedRecord.source_table).order_by(
+        ArchivedRecord.partition_key
+    ).all()
+
+    return [
+        {
+            "partition": key,
+            "source_table": source_table,
+            "documents": documents,
+            "records": records or 0,
+            "compressed_bytes": size or 0
+        }
+        for key, source_table, documents, records, size in partitions
+    ]
+
+
+class RetentionManager:
+
+    def __init__(self, retention_days: int = RETENTION_DAYS,
+                 batch_documents: int = ARCHIVE_BATCH_DOCUMENTS,
+                 vacuum_step_pages: int = VACUUM_STEP_PAGES):
+        self.retention_days = retention_days
+        self.batch_documents = batch_documents
+        self.vacuum_step_pages = vacuum_step_pages
+
+    def _archive_table(self, db: Session, source_table: str, cutoff: datetime) -> int:
+        model, timestamp_col = ARCHIVED_TABLES[source_table]
+
+        # Documents still in the pipeline keep their rows hot until they finish.
+        document_ids = [
+            document_id for (document_id,) in db.query(model.document_id).join(
+                Document, Document.id == model.document_id, isouter=True
+            ).filter(
+                timestamp_col < cutoff,
+                func.coalesce(Document.status, "completed") != "processing"
+            ).distinct().limit(self.batch_documents).all()
+        ]
+        if not document_ids:
+            return 0
+
+        # DELETE ... RETURNING hands each row to exactly one archiver, so two
+        # retention runs racing on the same documents cannot archive twice.
+        removed = db.execute(
+            delete(model).where(
+                model.document_id.in_(document_ids),
+                timestamp_col < cutoff
+            ).returning(*model.__table__.columns)
+        ).mappings().all()
+
+        partitions: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in removed:
+            moment = row[timestamp_col.key] or cutoff
+            partitions.setdefault((row["document_id"], partition_key(moment)), []).append(dict(row))
+
+        for (document_id, key), rows in partitions.items():
+            db.add(ArchivedRecord(
+                source_table=source_table,
+                partition_key=key,
+                document_id=document_id,
+                record_count=len(rows),
+                payload=_encode_rows(rows),
+                archived_at=datetime.utcnow()
+            ))
+
+        db.commit()
+        return len(removed)
+
+    def archive_once(self) -> Dict[str, int]:
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        archived = {}
+        for source_table in ARCHIVED_TABLES:
+            total = 0
+            while True:
+                db = SessionLocal()
+                try:
+                    moved = self._archive_table(db, source_table, cutoff)
+                finally:
+                    db.close()
+                total += moved
+                if moved == 0:
+                    break
+            archived[source_table] = total
+        return archived
+
+    def purge_partitions(self, older_than: str) -> int:
+        db = SessionLocal()
+        try:
+            purged = db.query(ArchivedRecord).filter(
+                ArchivedRecord.partition_key < older_than
+            ).delete(synchronize_session=False)
+            db.commit()
+            return purged
+        finally:
+            db.close()
+
+    def incremental_vacuum(self, max_steps: int = 64) -> int:
+        # Frees a few pages per short write transaction so writers only ever
+        # wait for one step, never for a whole-file VACUUM.
+        freed = 0
+        for _ in range(max_steps):
+            with engine.connect() as conn:
+                free_pages = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+                if free_pages == 0:
+                    break
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({self.vacuum_step_pages})")
+                conn.commit()
+            freed += min(free_pages, self.vacuum_step_pages)
+            time.sleep(0.01)
+        return freed
+
+    def run_once(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        archived = self.archive_once()
+        freed_pages = self.incremental_vacuum()
+        return {
+            "archived": archived,
+            "freed_pages": freed_pages,
+            "duration_seconds": round(time.perf_counter() - started, 3)
+        }
+
+    async def run_forever(self, interval: int = RETENTION_INTERVAL):
+        while True:
+            try:
+                result = await asyncio.to_thread(self.run_once)
+                if any(result["archived"].values()) or result["freed_pages"]:
+                    print(f"Retention run: {result}")
+            except Exception as e:
+                print(f"Retention run failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def enable_incremental_vacuum():
+    # auto_vacuum only changes on a full VACUUM; run once per existing database.
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old stage runs and lineage and compact the database")
+    parser.add_argument("--older-than-days", type=int, default=RETENTION_DAYS,
+                        help="archive stage runs and lineage older than this many days")
+    parser.add_argument("--purge-before", metavar="YYYY-MM",
+                        help="delete archive partitions older than this month")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch an existing database to incremental vacuum (runs a full VACUUM once)")
+    parser.add_argument("--loop", action="store_true",
+                        help="keep running every BASIRA_RETENTION_INTERVAL seconds")
+    args = parser.parse_args()
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+
+    manager = RetentionManager(retention_days=args.older_than_days)
+    if args.purge_before:
+        print(f"Purged {manager.purge_partitions(args.purge_before)} archive records")
+
+    if args.loop:
+        asyncio.run(manager.run_forever())
+    else:
+        print(manager.run_once())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import Document
+
+
+LANE_WEIGHTS = {
+    "interactive": 8,
+    "standard": 3,
+    "batch": 1
+}
+DEFAULT_LANE = "standard"
+STARVATION_SECONDS = float(os.environ.get("BASIRA_STARVATION_SECONDS", "300"))
+
+LANE_EXPR = func.coalesce(Document.priority, DEFAULT_LANE)
+TENANT_EXPR = func.coalesce(Document.tenant_id, "")
+
+
+class FairScheduler:
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None,
+                 starvation_seconds: float = STARVATION_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.weights = dict(weights or LANE_WEIGHTS)
+        self.starvation_seconds = starvation_seconds
+        self.clock = clock
+        self._virtual_time = 0.0
+        self._lane_pass = {lane: 0.0 for lane in self.weights}
+        self._tenant_pass: Dict[Tuple[str, str], float] = {}
+        self._last_served: Dict[str, float] = {}
+
+    def _waiting(self, lane: str, oldest_wait: float, now: float) -> float:
+        # Time since the lane was last served, but not counting time it had
+        # nothing queued: a backlog that is being drained is not starving.
+        if lane not in self._last_served:
+            return oldest_wait
+        return min(oldest_wait, now - self._last_served[lane])
+
+    def pick_lane(self, oldest_waits: Dict[str, float]) -> Optional[str]:
+        lanes = [lane for lane in oldest_waits if lane in self.weights]
+        if not lanes:
+            return None
+
+        # A lane that sat idle rejoins at the current virtual time instead of
+        # spending the credit it accumulated while it had nothing queued.
+        now = self.clock()
+        for lane in lanes:
+            self._lane_pass[lane] = max(self._lane_pass[lane], self._virtual_time)
+            # A starving lane gets one dispatch of credit rather than the whole
+            # scheduler: its pass drops to the current virtual time, and being
+            # served resets its wait.
+            if self._waiting(lane, oldest_waits[lane], now) >= self.starvation_seconds:
+                self._lane_pass[lane] = self._virtual_time
+        return min(lanes, key=lambda lane: (self._lane_pass[lane], -self.weights[lane]))
+
+    def pick_tenant(self, lane: str, tenants: List[str]) -> Optional[str]:
+        if not tenants:
+            return None
+        floor = min((self._tenant_pass.get((lane, t), 0.0) for t in tenants), default=0.0)
+        return min(tenants, key=lambda t: (self._tenant_pass.get((lane, t), floor), t))
+
+    def record_dispatch(self, lane: str, tenant: str):
+        self._virtual_time = self._lane_pass.get(lane, self._virtual_time)
+        self._lane_pass[lane] = self._virtual_time + 1.0 / self.weights.get(lane, 1)
+        self._last_served[lane] = self.clock()
+        key = (lane, tenant)
+        self._tenant_pass[key] = self._tenant_pass.get(key, 0.0) + 1.0
+
+    def next_candidates(self, db: Session, claimable, now: datetime, limit: int):
+        oldest = db.query(LANE_EXPR, func.min(Document.upload_timestamp)).filter(
+            claimable
+        ).group_by(LANE_EXPR).all()
+        oldest_waits = {
+            lane: (now - uploaded).total_seconds() if uploaded else 0.0
+            for lane, uploaded in oldest
+        }
+
+        lane = self.pick_lane(oldest_waits)
+        if lane is None:
+            return None, None, []
+
+        tenants = [
+            tenant for (tenant,) in db.query(TENANT_EXPR).filter(
+                claimable, LANE_EXPR == lane
+            ).distinct().all()
+        ]
+        tenant = self.pick_tenant(lane, tenants)
+
+        candidates = db.query(Document.id, Document.attempts).filter(
+            claimable, LANE_EXPR == lane, TENANT_EXPR == tenant
+        ).order_by(Document.upload_timestamp).limit(limit).all()
+        return lane, tenant, candidates
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def lane_report(db: Session, window_seconds: int = 3600) -> Dict[str, Dict[str, float]]:
+    now = datetime.utcnow()
+    report = {}
+
+    queued = db.query(
+        LANE_EXPR, func.count(Document.id), func.min(Document.upload_timestamp)
+    ).filter(
+        Document.status == "processing", Document.dispatched_at.is_(None)
+    ).group_by(LANE_EXPR).all()
+
+    for lane in LANE_WEIGHTS:
+        report[lane] = {
+            "weight": LANE_WEIGHTS[lane],
+            "queued": 0,
+            "oldest_queued_seconds": 0.0,
+            "dispatched": 0,
+            "wait_avg_seconds": 0.0,
+            "wait_p50_seconds": 0.0,
+            "wait_p95_seconds": 0.0,
+            "wait_max_seconds": 0.0
+        }
+
+    for lane, count, oldest in queued:
+        entry = report.setdefault(lane, {"weight": 0})
+        entry["queued"] = count
+        entry["oldest_queued_seconds"] = (now - oldest).total_seconds() if oldest else 0.0
+
+    dispatched = db.query(
+        LANE_EXPR, Document.upload_timestamp, Document.dispatched_at
+    ).filter(
+        Document.dispatched_at >= now - timedelta(seconds=window_seconds)
+    ).all()
+
+    waits: Dict[str, List[float]] = {}
+    for lane, uploaded, dispatched_at in dispatched:
+        waits.setdefault(lane, []).append(max(0.0, (dispatched_at - uploaded).total_seconds()))
+
+    for lane, values in waits.items():
+        entry = report.setdefault(lane, {"weight": 0})
+        entry["dispatched"] = len(values)
+        entry["wait_avg_seconds"] = sum(values) / len(values)
+        entry["wait_p50_seconds"] = _percentile(values, 50)
+        entry["wait_p95_seconds"] = _percentile(values, 95)
+        entry["wait_max_seconds"] = max(values)
+
+    return report
@@ -0,0 +1,185 @@
+import argparse
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import SessionLocal, init_db, SEARCH_TABLE, Document, MedallionData, SearchIndexEntry
+from blob_store import blob_store
+
+
+# Bookkeeping fields every extraction carries; indexing them only adds noise.
+SKIPPED_FIELDS = {"model_version", "extraction_timestamp"}
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_available = False
+
+
+def search_available(db: Session) -> bool:
+    # Only a positive answer is cached: the table may be created later by
+    # init_db() in this or another process, and search must then turn on.
+    global _available
+    if not _available:
+        _available = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_TABLE}
+        ).first() is not None
+    return _available
+
+
+def _flatten(value: Any, path: str = "") -> List[Tuple[str, str]]:
+    if isinstance(value, dict):
+        pairs = []
+        for key, item in value.items():
+            if key in SKIPPED_FIELDS:
+                continue
+            pairs.extend(_flatten(item, f"{path}.{key}" if path else key))
+        return pairs
+    if isinstance(value, list):
+        pairs = []
+        for item in value:
+            pairs.extend(_flatten(item, path))
+        return pairs
+    if value is None or value == "":
+        return []
+    return [(path, str(value))]
+
+
+def index_document(db: Session, document_id: str, filename: str, document_type: Optional[str],
+                   redacted_data: Dict[str, Any]):
+    if not search_available(db):
+        return
+
+    pairs = _flatten(redacted_data or {})
+    fields = "\n".join(f"{path}: {value}" for path, value in pairs)
+    content = "\n".join(value for _, value in pairs)
+
+    # FTS5 rows are addressed by rowid, so the document -> rowid mapping
+    # keeps re-indexing a single-row delete instead of a table scan.
+    entry = db.query(SearchIndexEntry).filter(SearchIndexEntry.document_id == document_id).first()
+    if entry is not None:
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid"), {"rowid": entry.search_rowid})
+
+    result = db.execute(
+        text(
+            f"INSERT INTO {SEARCH_TABLE} (filename, document_type, fields, content) "
+            "VALUES (:filename, :document_type, :fields, :content)"
+        ),
+        {"filename": filename or "", "document_type": document_type or "", "fields": fields, "content": content}
+    )
+
+    if entry is None:
+        entry = SearchIndexEntry(document_id=document_id)
+        db.add(entry)
+    entry.search_rowid = result.lastrowid
+    entry.indexed_at = datetime.utcnow()
+
+
+def build_match_query(query: str) -> str:
+    # Quote every term so user input can never be parsed as FTS5 syntax;
+    # a trailing '*' on the last term keeps prefix search available.
+    terms = TOKEN_PATTERN.findall(query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if query.rstrip().endswith("*"):
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_documents(db: Session, query: str, document_type: Optional[str] = None,
+                     status: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    match = build_match_query(query)
+    if not match:
+        return {"total": 0, "results": []}
+
+    filters = ""
+    params: Dict[str, Any] = {"match": match, "limit": limit, "offset": offset}
+    if document_type:
+        filters += " AND d.document_type = :document_type"
+        params["document_type"] = document_type
+    if status:
+        filters += " AND d.status = :status"
+        params["status"] = status
+
+    base = (
+        f"FROM {SEARCH_TABLE} "
+        f"JOIN document_search_rows m ON m.search_rowid = {SEARCH_TABLE}.rowid "
+        "JOIN documents d ON d.id = m.document_id "
+        f"WHERE {SEARCH_TABLE} MATCH :match{filters}"
+    )
+
+    total = db.execute(text(f"SELECT count(*) {base}"), params).scalar()
+    rows = db.execute(
+        text(
+            "SELECT d.id, d.filename, d.document_type, d.status, d.upload_timestamp, "
+            f"bm25({SEARCH_TABLE}) AS score, "
+            f"snippet({SEARCH_TABLE}, 2, '[', ']', '...', 12) AS snippet "
+            f"{base} ORDER BY score LIMIT :limit OFFSET :offset"
+        ),
+        params
+    ).all()
+
+    return {
+        "total": total,
+        "results": [
+            {
+                "document_id": row.id,
+                "filename": row.filename,
+                "document_type": row.document_type,
+                "status": row.status,
+                "upload_timestamp": row.upload_timestamp,
+                "score": -row.score,
+                "snippet": row.snippet
+            }
+            for row in rows
+        ]
+    }
+
+
+def rebuild(batch_size: int = 500) -> int:
+    db = SessionLocal()
+    indexed = 0
+    try:
+        last_id = 0
+        while True:
+            rows = db.query(MedallionData, Document).join(
+                Document, Document.id == MedallionData.document_id
+            ).filter(
+                MedallionData.layer == "silver",
+                MedallionData.id > last_id
+            ).order_by(MedallionData.id).limit(batch_size).all()
+            if not rows:
+                break
+            for silver, document in rows:
+                data = blob_store.resolve(db, silver.data)
+                index_document(db, document.id, document.filename, document.document_type,
+                               data.get("redacted_data"))
+                indexed += 1
+            last_id = rows[-1][0].id
+            db.commit()
+    finally:
+        db.close()
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the full-text document search index")
+    parser.add_argument("--rebuild", action="store_true", help="index every document with a silver layer")
+    parser.add_argument("--query", help="run a search from the command line")
+    args = parser.parse_args()
+
+    init_db()
+    if args.rebuild:
+        print(f"Indexed {rebuild()} documents")
+    if args.query:
+        db = SessionLocal()
+        try:
+            for result in search_documents(db, args.query)["results"]:
+                print(f"{result['score']:.3f}  {result['document_id']}  {result['filename']}  {result['snippet']}")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
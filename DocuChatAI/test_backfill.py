@@ -0,0 +1,284 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from database import SessionLocal, init_db, BackfillJob, Document, LineageLog, MedallionData, StageRun
+from lineage_journal import lineage_journal
+from pipeline_stages import PipelineStages
+from worker import DocumentProcessor
+from backfill import BackfillEngine
+
+
+def _process_sample(db, path):
+    document_id = str(uuid.uuid4())
+    db.add(Document(
+        id=document_id,
+        filename=os.path.basename(path),
+        file_path=path,
+        upload_timestamp=datetime.utcnow(),
+        current_stage="queued",
+        status="processing"
+    ))
+    db.commit()
+    asyncio.run(DocumentProcessor().process_document(document_id))
+    return document_id
+
+
+def test_validation_bump_reruns_only_downstream_stages():
+    init_db()
+    db = SessionLocal()
+    document_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+
+    original_version = PipelineStages.VALIDATION_VERSION
+    PipelineStages.VALIDATION_VERSION = "v9.9-test-rules"
+    try:
+        engine = BackfillEngine()
+        job = engine.create_job(db, ["validation"], document_type="PAYSLIP")
+        assert job.total == 1
+
+        progress = asyncio.run(engine.run(job.id))
+        assert progress["status"] == "completed"
+        assert progress["succeeded"] == 1
+
+        stage_names = [
+            name for (name,) in db.query(StageRun.stage_name).filter(
+                StageRun.document_id == document_id
+            ).order_by(StageRun.id).all()
+        ]
+        assert stage_names[6:] == ["validate", "lineage", "medallion"]
+
+        document = db.query(Document).filter(Document.id == document_id).first()
+        assert document.validation_version == "v9.9-test-rules"
+        assert document.status == "completed"
+
+        lineage_journal.flush()
+        event = db.query(LineageLog).filter(
+            LineageLog.document_id == document_id,
+            LineageLog.event_type == "REPROCESSING_COMPLETED"
+        ).one()
+        assert event.event_metadata["backfill_job_id"] == job.id
+
+        assert engine.create_job(db, ["validation"], document_type="PAYSLIP").total == 0
+    finally:
+        PipelineStages.VALIDATION_VERSION = original_version
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+def _hold(db, document_id, owner):
+    document = db.query(Document).filter(Document.id == document_id).first()
+    document.lease_owner = owner
+    document.lease_expires_at = datetime.utcnow() + timedelta(minutes=5) if owner else None
+    db.commit()
+
+
+def test_document_held_by_a_worker_is_retried_before_completing():
+    init_db()
+    db = SessionLocal()
+    uploaded_after = datetime.utcnow()
+    held_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+    other_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+
+    original_version = PipelineStages.VALIDATION_VERSION
+    PipelineStages.VALIDATION_VERSION = "v9.9-held"
+    try:
+        _hold(db, held_id, "worker-busy")
+        engine = BackfillEngine(retry_seconds=0.05, retry_rounds=1)
+        job = engine.create_job(db, ["validation"], uploaded_after=uploaded_after)
+        assert job.total == 2
+
+        # Still held after every retry: the job pauses instead of completing.
+        progress = asyncio.run(engine.run(job.id))
+        assert progress["status"] == "paused"
+        assert progress["succeeded"] == 1
+        assert progress["skipped"] == 1
+        assert progress["remaining"] == 1
+
+        async def release_later():
+            await asyncio.sleep(0.1)
+            _hold(db, held_id, None)
+
+        async def resume():
+            engine.retry_rounds = 3
+            release = asyncio.create_task(release_later())
+            result = await engine.run(job.id)
+            await release
+            return result
+
+        progress = asyncio.run(resume())
+        assert progress["status"] == "completed"
+        assert progress["succeeded"] == 2
+        assert progress["skipped"] == 0
+        assert progress["remaining"] == 0
+
+        db.expire_all()
+        for document_id in (held_id, other_id):
+            document = db.query(Document).filter(Document.id == document_id).first()
+            assert document.validation_version == "v9.9-held"
+    finally:
+        PipelineStages.VALIDATION_VERSION = original_version
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+def test_lost_lease_skips_the_document_without_stopping_the_job():
+    init_db()
+    db = SessionLocal()
+    uploaded_after = datetime.utcnow()
+    lost_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+    kept_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+
+    original_version = PipelineStages.VALIDATION_VERSION
+    PipelineStages.VALIDATION_VERSION = "v9.9-lease-lost"
+    try:
+        # Another worker takes over lost_id while its validate stage runs:
+        # the lease heartbeat fails to renew and cancels that document.
+        processor = DocumentProcessor(worker_id="backfill-test", lease_seconds=0.3)
+        processor.renew_lease = lambda document_id: document_id != lost_id
+        stages = dict(processor.stages)
+        validate = stages["validate"]
+
+        async def slow_validate(db, stage_run, context):
+            await asyncio.sleep(0.5)
+            return await validate(db, stage_run, context)
+
+        processor.stages = [(name, slow_validate if name == "validate" else func) for name, func in processor.stages]
+        engine = BackfillEngine(processor, retry_seconds=0.05, retry_rounds=0)
+        job = engine.create_job(db, ["validation"], uploaded_after=uploaded_after)
+
+        progress = asyncio.run(engine.run(job.id))
+        assert progress["status"] == "paused"
+        assert progress["succeeded"] == 1
+        assert progress["skipped"] == 1
+
+        db.expire_all()
+        lost = db.query(Document).filter(Document.id == lost_id).first()
+        kept = db.query(Document).filter(Document.id == kept_id).first()
+        assert kept.validation_version == "v9.9-lease-lost"
+        assert lost.validation_version != "v9.9-lease-lost"
+        assert lost.lease_owner is None
+    finally:
+        PipelineStages.VALIDATION_VERSION = original_version
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+def test_resuming_a_job_twice_runs_one_engine():
+    init_db()
+    db = SessionLocal()
+    uploaded_after = datetime.utcnow()
+    for _ in range(3):
+        _process_sample(db, "sample_docs/sample_payslip.pdf")
+
+    original_version = PipelineStages.VALIDATION_VERSION
+    PipelineStages.VALIDATION_VERSION = "v9.9-resumed-twice"
+    try:
+        engine = BackfillEngine()
+        job = engine.create_job(db, ["validation"], uploaded_after=uploaded_after, batch_size=1)
+
+        async def resume_twice():
+            return await asyncio.gather(engine.run(job.id), engine.run(job.id))
+
+        first, second = asyncio.run(resume_twice())
+        assert first["status"] == "completed"
+        assert first["processed"] == first["succeeded"] == 3
+        # The second call found the job running and left it alone.
+        assert second["status"] == "running"
+        assert second["processed"] < 3
+
+        db.expire_all()
+        job = db.query(BackfillJob).filter(BackfillJob.id == job.id).one()
+        assert (job.status, job.processed, job.succeeded) == ("completed", 3, 3)
+    finally:
+        PipelineStages.VALIDATION_VERSION = original_version
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+def test_only_a_stale_running_job_can_be_claimed():
+    init_db()
+    db = SessionLocal()
+    engine = BackfillEngine(heartbeat_seconds=15)
+    try:
+        job = engine.create_job(db, ["validation"])
+        assert engine.claim(db, job.id)
+        assert not engine.claim(db, job.id)
+
+        # Orphaned by a crash: no heartbeat for longer than the lease.
+        job.updated_at = datetime.utcnow() - timedelta(hours=1)
+        db.commit()
+        assert engine.claim(db, job.id)
+
+        job.status = "completed"
+        db.commit()
+        assert not engine.claim(db, job.id)
+    finally:
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+def test_failed_medallion_rerun_keeps_the_previous_layers():
+    init_db()
+    db = SessionLocal()
+    uploaded_after = datetime.utcnow()
+    document_id = _process_sample(db, "sample_docs/sample_payslip.pdf")
+    layers = lambda: sorted(
+        (row.id, row.layer) for row in db.query(MedallionData).filter(MedallionData.document_id == document_id)
+    )
+    promoted = layers()
+    assert [layer for _, layer in promoted] == ["bronze", "silver", "gold"]
+
+    async def delete_then_fail(db, stage_run, context):
+        db.query(MedallionData).filter(MedallionData.document_id == context["document_id"]).delete()
+        raise RuntimeError("disk full")
+
+    async def delete_then_hang(db, stage_run, context):
+        db.query(MedallionData).filter(MedallionData.document_id == context["document_id"]).delete()
+        await asyncio.sleep(30)
+
+    original_version = PipelineStages.VALIDATION_VERSION
+    try:
+        for version, stage, expected_status in (
+            ("v9.9-medallion-fails", delete_then_fail, "failed"),
+            ("v9.9-medallion-hangs", delete_then_hang, "quarantined")
+        ):
+            PipelineStages.VALIDATION_VERSION = version
+            processor = DocumentProcessor(worker_id="backfill-test", stage_timeouts={"medallion": 0.2})
+            processor.stages = [(name, stage if name == "medallion" else func) for name, func in processor.stages]
+            engine = BackfillEngine(processor)
+            job = engine.create_job(db, ["validation"], uploaded_after=uploaded_after)
+
+            progress = asyncio.run(engine.run(job.id))
+            assert progress["failed"] == 1
+
+            db.expire_all()
+            document = db.query(Document).filter(Document.id == document_id).first()
+            assert document.status == expected_status
+            assert layers() == promoted
+    finally:
+        PipelineStages.VALIDATION_VERSION = original_version
+        db.query(BackfillJob).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    test_validation_bump_reruns_only_downstream_stages()
+    test_document_held_by_a_worker_is_retried_before_completing()
+    test_lost_lease_skips_the_document_without_stopping_the_job()
+    test_resuming_a_job_twice_runs_one_engine()
+    test_only_a_stale_running_job_can_be_claimed()
+    test_failed_medallion_rerun_keeps_the_previous_layers()
+    print("Backfill tests passed!")
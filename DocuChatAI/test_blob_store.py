@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from database import SessionLocal, init_db, Blob
+from blob_store import BlobStore, is_blob_ref
+
+
+def test_identical_payloads_are_stored_once():
+    init_db()
+    db = SessionLocal()
+    store = BlobStore(cache_size=4)
+    payload = {"vendor_name": "Example Tech Solutions", "total_amount": 1500.0, "line_items": []}
+
+    first = store.put(db, payload)
+    second = store.put(db, {"line_items": [], "total_amount": 1500.0, "vendor_name": "Example Tech Solutions"})
+    db.commit()
+
+    assert first == second
+    assert is_blob_ref(first)
+    assert db.query(Blob).filter(Blob.hash == first["$blob"]).count() == 1
+    db.close()
+
+
+def test_resolve_reads_through_cache():
+    init_db()
+    db = SessionLocal()
+    writer = BlobStore(cache_size=4)
+    ref = writer.put(db, {"email": "[REDACTED-EMAIL]"})
+    db.commit()
+
+    reader = BlobStore(cache_size=4)
+    stored = {"redacted_data": ref, "pii_redacted": True}
+    assert reader.resolve(db, stored) == {"redacted_data": {"email": "[REDACTED-EMAIL]"}, "pii_redacted": True}
+    assert reader.resolve(db, stored) == reader.resolve(db, stored)
+    assert reader.misses == 1
+    assert reader.hits == 2
+    db.close()
+
+
+def test_cache_evicts_least_recently_used():
+    init_db()
+    db = SessionLocal()
+    store = BlobStore(cache_size=2)
+    refs = [store.put(db, {"n": n}) for n in range(3)]
+    db.commit()
+    for n, ref in enumerate(refs):
+        assert store.get(db, ref["$blob"]) == {"n": n}
+
+    assert store.stats()["cached"] == 2
+    assert store.get(db, refs[0]["$blob"]) == {"n": 0}
+    assert store.misses == 4
+    db.close()
+
+
+def test_rolled_back_blob_is_not_served_from_cache():
+    init_db()
+    db = SessionLocal()
+    store = BlobStore(cache_size=4)
+    ref = store.put(db, {"rolled": "back"})
+    db.rollback()
+
+    try:
+        store.get(db, ref["$blob"])
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected KeyError")
+    db.close()
+
+
+if __name__ == "__main__":
+    test_identical_payloads_are_stored_once()
+    test_resolve_reads_through_cache()
+    test_cache_evicts_least_recently_used()
+    test_rolled_back_blob_is_not_served_from_cache()
+    print("Blob store tests passed!")
@@ -0,0 +1,61 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from database import SessionLocal, init_db, Document, MedallionData
+from blob_store import blob_store
+from export import stream_export
+
+
+def _seed():
+    init_db()
+    db = SessionLocal()
+    db.query(MedallionData).filter(MedallionData.document_id.like("export-%")).delete(synchronize_session=False)
+    for i, (document_type, uploaded) in enumerate([
+        ("INVOICE", datetime(2025, 10, 31)),
+        ("INVOICE", datetime(2025, 11, 3)),
+        ("PAYSLIP", datetime(2025, 11, 4))
+    ]):
+        document_id = f"export-{i}"
+        db.merge(Document(id=document_id, filename=f"{document_id}.pdf", file_path="",
+                          status="completed", document_type=document_type, upload_timestamp=uploaded))
+        db.add(MedallionData(document_id=document_id, layer="gold", data={
+            "curated_data": blob_store.put(db, {"vendor_name": f"Vendor {i}", "total_amount": 100.0 * i}),
+            "document_type": document_type
+        }))
+    db.commit()
+    db.close()
+
+
+def test_ndjson_export_filters_by_month_and_type():
+    _seed()
+    body = b"".join(stream_export("gold", "ndjson", datetime(2025, 11, 1), datetime(2025, 12, 1), "INVOICE"))
+    rows = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+    assert [row["document_id"] for row in rows] == ["export-1"]
+    assert rows[0]["data"]["curated_data"] == {"vendor_name": "Vendor 1", "total_amount": 100.0}
+
+
+def test_gzipped_csv_export():
+    _seed()
+    body = b"".join(stream_export("gold", "csv", datetime(2025, 10, 1), datetime(2025, 12, 1), gzip=True))
+    reader = csv.DictReader(io.StringIO(gzip.decompress(body).decode("utf-8")))
+    rows = [row for row in reader if row["document_id"].startswith("export-")]
+
+    assert [row["document_id"] for row in rows] == ["export-0", "export-1", "export-2"]
+    assert json.loads(rows[2]["data"])["curated_data"]["vendor_name"] == "Vendor 2"
+
+
+if __name__ == "__main__":
+    test_ndjson_export_filters_by_month_and_type()
+    test_gzipped_csv_export()
+    print("Export tests passed!")
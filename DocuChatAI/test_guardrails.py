@@ -0,0 +1,202 @@
+import asyncio
+import os
+import signal
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+os.environ.setdefault("BASIRA_LINEAGE_DIR", tempfile.mkdtemp())
+
+import pickle
+
+from database import SessionLocal, init_db, Document, LineageLog, StageRun
+import guardrails
+from guardrails import BudgetExceeded, Sandbox, sandbox
+from lineage_journal import lineage_journal
+from pdf_backends import text_extractor
+from pipeline_stages import PipelineStages
+from worker import DocumentProcessor
+
+# "Total" followed by a long run of spaces sends the invoice_total pattern
+# into cubic backtracking: minutes of CPU for one short page of text.
+PATHOLOGICAL_TEXT = "Invoice\nTotal" + " " * 3000 + "x\n"
+
+
+def _extract_invoice(text):
+    return PipelineStages.extract_fields(text, "INVOICE")
+
+
+def test_cpu_budget_interrupts_backtracking_regex():
+    guard = Sandbox(processes=1, budgets={"extract": (0.5, 30.0)})
+
+    async def run():
+        started = time.perf_counter()
+        try:
+            await guard.run("extract", PipelineStages.extract_fields, PATHOLOGICAL_TEXT, "INVOICE")
+        except BudgetExceeded as e:
+            assert "CPU budget" in str(e)
+            assert (e.label, e.budget, e.limit_seconds) == ("extract", "cpu", 0.5)
+            assert e.measured_seconds >= 0.5
+        else:
+            raise AssertionError("expected BudgetExceeded")
+        assert time.perf_counter() - started < 10
+
+        result = await guard.run("extract", PipelineStages.extract_fields, "Invoice #INV-7 Total: 10", "INVOICE")
+        assert result["fields"]["invoice_number"] == "INV-7"
+
+    try:
+        asyncio.run(run())
+        stats = guard.stats()
+        # The interrupted process was reused rather than replaced.
+        assert stats["processes_started"] == 1 and stats["processes_killed"] == 0
+        assert stats["budget_exceeded"] == {"extract": 1}
+    finally:
+        guard.close()
+
+
+def test_wall_budget_kills_and_replaces_the_process():
+    guard = Sandbox(processes=1, budgets={"pdf_text": (30.0, 0.5)})
+
+    async def run():
+        try:
+            await guard.run("pdf_text", time.sleep, 30)
+        except BudgetExceeded as e:
+            assert "wall-clock budget" in str(e)
+        else:
+            raise AssertionError("expected BudgetExceeded")
+        assert await guard.run("pdf_text", len, "ok") == 2
+
+    try:
+        asyncio.run(run())
+        stats = guard.stats()
+        assert stats["processes_started"] == 2 and stats["processes_killed"] == 1
+    finally:
+        guard.close()
+
+
+def test_batch_is_one_sandbox_call_with_a_budget_per_item():
+    guard = Sandbox(processes=1, budgets={"extract": (0.5, 30.0)})
+
+    async def run():
+        return await guard.run_batch("extract", _extract_invoice, [
+            "Invoice #INV-1 Total: 10", PATHOLOGICAL_TEXT, "Invoice #INV-3 Total: 30"
+        ])
+
+    try:
+        first, pathological, third = asyncio.run(run())
+        assert first["fields"]["invoice_number"] == "INV-1"
+        assert isinstance(pathological, BudgetExceeded) and pathological.budget == "cpu"
+        assert third["fields"]["invoice_number"] == "INV-3"
+        stats = guard.stats()
+        assert stats["calls"] == 1
+        assert stats["budget_exceeded"] == {"extract": 1}
+    finally:
+        guard.close()
+
+
+def test_cpu_signal_after_the_call_returns_is_ignored():
+    previous = signal.signal(signal.SIGPROF, guardrails._on_cpu_exhausted)
+    try:
+        assert guardrails._call_with_cpu_budget("extract", 5.0, len, ("ok",)) == 2
+        # A timer signal already in flight when the call unwound.
+        os.kill(os.getpid(), signal.SIGPROF)
+    finally:
+        signal.signal(signal.SIGPROF, previous)
+
+
+def test_pathological_document_is_quarantined():
+    init_db()
+    db = SessionLocal()
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(b"%PDF-1.4")
+    text_extractor.remember(f.name, ("pypdf2", PATHOLOGICAL_TEXT))
+    db.add(Document(
+        id="doc-pathological",
+        filename="pathological.pdf",
+        file_path=f.name,
+        upload_timestamp=datetime.utcnow(),
+        current_stage="queued",
+        status="processing"
+    ))
+    db.commit()
+
+    budgets = dict(sandbox.budgets)
+    sandbox.budgets["extract"] = (0.5, 30.0)
+    try:
+        asyncio.run(DocumentProcessor(worker_id="worker-q").process_document("doc-pathological"))
+    finally:
+        sandbox.budgets = budgets
+        os.remove(f.name)
+
+    db.expire_all()
+    document = db.query(Document).filter(Document.id == "doc-pathological").first()
+    assert document.status == "quarantined"
+    assert document.current_stage == "extract"
+    assert document.error_message.startswith("Quarantined at stage extract: extract exceeded its CPU budget")
+    assert document.lease_owner is None
+
+    runs = {run.stage_name: run for run in db.query(StageRun).filter(StageRun.document_id == "doc-pathological")}
+    assert runs["classify"].status == "completed"
+    assert runs["extract"].status == "budget_exceeded"
+    assert "CPU budget" in runs["extract"].error_message
+    assert "pii_detect" not in runs
+
+    lineage_journal.flush()
+    event = db.query(LineageLog).filter(
+        LineageLog.document_id == "doc-pathological",
+        LineageLog.event_type == "DOCUMENT_QUARANTINED"
+    ).one()
+    metadata = event.event_metadata
+    assert (metadata["stage"], metadata["label"], metadata["budget"]) == ("extract", "extract", "cpu")
+    assert metadata["limit_seconds"] == 0.5
+    assert metadata["measured_seconds"] >= 0.5
+    assert document.error_message.endswith("s of CPU")
+    db.close()
+
+
+def test_stage_wall_clock_budget_quarantines():
+    init_db()
+    db = SessionLocal()
+    db.add(Document(id="doc-slow", filename="slow.pdf", file_path="slow.pdf",
+                    upload_timestamp=datetime.utcnow(), current_stage="queued", status="processing"))
+    db.commit()
+
+    processor = DocumentProcessor(worker_id="worker-w", stage_timeouts={"classify": 0.2})
+
+    async def hang(db, stage_run, context):
+        await asyncio.sleep(30)
+
+    processor.stages[0] = ("classify", hang)
+    started = time.perf_counter()
+    asyncio.run(processor.process_document("doc-slow"))
+    assert time.perf_counter() - started < 10
+
+    db.expire_all()
+    document = db.query(Document).filter(Document.id == "doc-slow").first()
+    assert document.status == "quarantined"
+    run = db.query(StageRun).filter(StageRun.document_id == "doc-slow").one()
+    assert run.status == "budget_exceeded"
+    assert run.error_message.startswith("Stage classify exceeded its wall-clock budget of 0.2s after 0.2")
+    assert document.error_message == f"Quarantined at stage classify: {run.error_message}"
+    db.close()
+
+
+def test_budget_exceeded_survives_pickling():
+    error = pickle.loads(pickle.dumps(BudgetExceeded("pdf_text", "wall", 40.0, 40.01)))
+    assert error.details() == {"label": "pdf_text", "budget": "wall", "limit_seconds": 40.0, "measured_seconds": 40.01}
+    assert str(error) == "pdf_text exceeded its wall-clock budget of 40s after 40.01s"
+
+
+if __name__ == "__main__":
+    test_cpu_budget_interrupts_backtracking_regex()
+    test_wall_budget_kills_and_replaces_the_process()
+    test_batch_is_one_sandbox_call_with_a_budget_per_item()
+    test_cpu_signal_after_the_call_returns_is_ignored()
+    test_pathological_document_is_quarantined()
+    test_stage_wall_clock_budget_quarantines()
+    test_budget_exceeded_survives_pickling()
+    print("Guardrail tests passed!")
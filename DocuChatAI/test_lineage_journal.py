@@ -0,0 +1,161 @@
+import fcntl
+import glob
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from database import SessionLocal, init_db, LineageLog
+import lineage_journal as lineage_journal_module
+from lineage_journal import LineageJournal
+from retention import RetentionManager, load_archived
+
+
+def _events(db, document_id):
+    return db.query(LineageLog).filter(LineageLog.document_id == document_id).all()
+
+
+def test_events_are_readable_before_and_after_flush():
+    init_db()
+    journal = LineageJournal(root=tempfile.mkdtemp(), segment_bytes=300, flush_interval=3600)
+    journal.start()
+    db = SessionLocal()
+    try:
+        for i in range(5):
+            journal.append("doc-read", "STAGE_EVENT", event_metadata={"i": i})
+
+        assert _events(db, "doc-read") == []
+        pending = journal.events_for(db, "doc-read")
+        assert [e["event_metadata"]["i"] for e in pending] == [0, 1, 2, 3, 4]
+        assert len(glob.glob(os.path.join(journal.directory, "segment-*.jsonl"))) > 1
+
+        assert journal.flush() == 5
+        db.expire_all()
+        assert len(_events(db, "doc-read")) == 5
+        assert journal.events_for(db, "doc-read") == pending
+        # Only the active segment is left once the closed ones are in lineage_log.
+        assert len(glob.glob(os.path.join(journal.directory, "segment-*.jsonl"))) == 1
+    finally:
+        journal.close()
+        db.close()
+    assert not os.path.exists(journal.directory)
+
+
+def test_journal_of_a_crashed_process_is_replayed_once():
+    init_db()
+    root = tempfile.mkdtemp()
+    crashed = LineageJournal(root=root, flush_interval=3600)
+    crashed.start()
+    for i in range(3):
+        crashed.append("doc-crash", "STAGE_EVENT", event_metadata={"i": i})
+    # The first event reached lineage_log before the crash, the rest did not.
+    crashed.flush_batch = 1
+    crashed._queue = crashed._queue[:1]
+    crashed.flush()
+    crashed._lock_file.close()
+    crashed._pid = None
+
+    survivor = LineageJournal(root=root, flush_interval=3600)
+    survivor.start()
+    db = SessionLocal()
+    try:
+        # All three are replayed; the one already flushed is skipped by event_id.
+        assert survivor.recovered == 3
+        assert sorted(e.event_metadata["i"] for e in _events(db, "doc-crash")) == [0, 1, 2]
+        assert not os.path.exists(crashed.directory)
+    finally:
+        survivor.close()
+        db.close()
+
+
+class _RecoverWhileStarting:
+    # Stands in for fcntl inside lineage_journal and runs a sibling's
+    # recover() at the worst moment: after start() has created its
+    # directory, just before it takes the lock.
+
+    LOCK_EX = fcntl.LOCK_EX
+    LOCK_NB = fcntl.LOCK_NB
+
+    def __init__(self, sibling):
+        self.sibling = sibling
+        self.recovering = False
+
+    def flock(self, f, operation):
+        if operation == fcntl.LOCK_EX and not self.recovering:
+            self.recovering = True
+            try:
+                self.sibling.recover()
+            finally:
+                self.recovering = False
+        return fcntl.flock(f, operation)
+
+
+def test_recover_running_alongside_start_never_takes_a_live_journal():
+    init_db()
+    root = tempfile.mkdtemp()
+    journal = LineageJournal(root=root, flush_interval=3600)
+    lineage_journal_module.fcntl = _RecoverWhileStarting(LineageJournal(root=root))
+    try:
+        journal.start()
+    finally:
+        lineage_journal_module.fcntl = fcntl
+
+    db = SessionLocal()
+    try:
+        assert os.path.isdir(journal.directory)
+        journal.append("doc-race", "STAGE_EVENT")
+        assert journal.flush() == 1
+        assert len(_events(db, "doc-race")) == 1
+    finally:
+        journal.close()
+        db.close()
+
+
+def test_late_replay_skips_events_retention_already_archived():
+    init_db()
+    root = tempfile.mkdtemp()
+    crashed = LineageJournal(root=root, flush_interval=3600)
+    crashed.start()
+    old = datetime.utcnow() - timedelta(days=60)
+    for i in range(3):
+        crashed.append("doc-archived", "STAGE_EVENT", timestamp=old + timedelta(seconds=i), event_metadata={"i": i})
+    crashed.flush()
+    # Crashed before the active segment was removed, and stayed down past
+    # the retention window.
+    crashed._lock_file.close()
+    crashed._pid = None
+
+    assert RetentionManager(retention_days=30).archive_once()["lineage_log"] >= 3
+
+    survivor = LineageJournal(root=root, flush_interval=3600)
+    survivor.start()
+    db = SessionLocal()
+    try:
+        assert _events(db, "doc-archived") == []
+        assert sorted(row["event_metadata"]["i"] for row in load_archived(db, "doc-archived", "lineage_log")) == [0, 1, 2]
+        assert not os.path.exists(crashed.directory)
+    finally:
+        survivor.close()
+        db.close()
+
+
+def test_unknown_fsync_policy_is_rejected():
+    try:
+        LineageJournal(root=tempfile.mkdtemp(), fsync="sometimes")
+    except ValueError as e:
+        assert "sometimes" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    test_events_are_readable_before_and_after_flush()
+    test_journal_of_a_crashed_process_is_replayed_once()
+    test_recover_running_alongside_start_never_takes_a_live_journal()
+    test_late_replay_skips_events_retention_already_archived()
+    test_unknown_fsync_policy_is_rejected()
+    print("Lineage journal tests passed!")
@@ -0,0 +1,53 @@
+import os
+
+from loadtest import LoadTest, LocalServer, encode_multipart, percentile, summarize
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_docs")
+
+
+def test_percentiles_and_summary():
+    assert percentile([], 50) is None
+    assert percentile([3.0, 1.0, 2.0], 50) == 2.0
+    assert percentile([float(i) for i in range(1, 101)], 99) == 99.0
+
+    results = [
+        {"outcome": "completed", "upload_seconds": 0.01, "e2e_seconds": 2.0},
+        {"outcome": "completed", "upload_seconds": 0.03, "e2e_seconds": 4.0},
+        {"outcome": "failed", "upload_seconds": 0.02, "e2e_seconds": 1.0},
+        {"outcome": "upload_error", "upload_seconds": 30.0, "error": "HTTP 500"}
+    ]
+    summary = summarize(results, rate=2.0, offered_seconds=2.0, elapsed=4.0, size_before=1000, size_after=5000)
+    assert summary["outcomes"] == {"completed": 2, "failed": 1, "upload_error": 1}
+    assert summary["error_rate"] == 0.5
+    assert summary["completed_rate"] == 0.5
+    assert summary["upload_ms"]["max"] == 30.0
+    assert summary["e2e_ms"]["p50"] == 2000.0
+    assert summary["db_bytes_per_document"] == 1000
+
+
+def test_multipart_body_carries_fields_and_file():
+    body, content_type = encode_multipart({"priority": "batch"}, "a.pdf", b"%PDF-1.4 data")
+    boundary = content_type.split("boundary=")[1]
+    assert body.startswith(f"--{boundary}\r\n".encode())
+    assert body.endswith(f"--{boundary}--\r\n".encode())
+    assert b'name="priority"\r\n\r\nbatch\r\n' in body
+    assert b'filename="a.pdf"' in body and b"%PDF-1.4 data" in body
+
+
+def test_load_step_against_scratch_server():
+    corpus = [os.path.join(SAMPLE_DIR, name) for name in sorted(os.listdir(SAMPLE_DIR)) if name.endswith(".pdf")]
+    with LocalServer(model_latency_scale=0) as server:
+        load = LoadTest(server.url, corpus, poll_interval=0.1, timeout=30, seed=7)
+        summary = load.run_step(rate=4, duration=1.0, arrival="uniform", db_path=server.db_path)
+
+    assert summary["sent"] == 4
+    assert summary["outcomes"] == {"completed": 4}
+    assert summary["e2e_ms"]["p99"] is not None
+    assert summary["db_bytes_after"] > 0
+
+
+if __name__ == "__main__":
+    test_percentiles_and_summary()
+    test_multipart_body_carries_fields_and_file()
+    test_load_step_against_scratch_server()
+    print("Load test harness tests passed!")
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+os.environ.setdefault("BASIRA_MODEL_LATENCY_SCALE", "0")
+
+import uvicorn
+
+from model_client import MicroBatcher, ModelClient, ModelServiceError
+from model_server import create_app
+
+
+def test_concurrent_requests_are_micro_batched():
+    sizes = []
+
+    async def call_batch(items):
+        sizes.append(len(items))
+        return [item * 10 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(call_batch, max_batch_size=4, linger_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        single = await batcher.submit(7)
+        return results, single, batcher.stats()
+
+    results, single, stats = asyncio.run(run())
+    assert results == [i * 10 for i in range(10)]
+    assert single == 70
+    assert sizes == [4, 4, 2, 1]
+    assert stats["largest_batch"] == 4 and stats["items"] == 11
+
+
+def test_batch_failure_reaches_every_caller():
+    async def call_batch(items):
+        raise ModelServiceError("model unavailable")
+
+    async def run():
+        batcher = MicroBatcher(call_batch, max_batch_size=8, linger_ms=5)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ModelServiceError) for r in results)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_http_backend_reuses_pooled_connections():
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    try:
+        client = ModelClient(base_url=f"http://127.0.0.1:{port}", batch_size=8, linger_ms=10, pool_size=2)
+
+        async def run():
+            texts = ["Invoice total amount due", "Bank statement closing balance", "nothing here"]
+            classified = await asyncio.gather(*(client.classify(text) for text in texts))
+            redacted = await client.detect_pii({"email": "ahmed@example.com"})
+            extracted = await client.extract("Invoice #INV-42 Total: 1,250.00", "INVOICE")
+            return classified, redacted, extracted
+
+        classified, redacted, extracted = asyncio.run(run())
+        assert [c["document_type"] for c in classified] == ["INVOICE", "BANK_STATEMENT", "UNKNOWN"]
+        assert redacted["redacted_data"] == {"email": "[REDACTED-EMAIL]"}
+        assert extracted["fields"]["invoice_number"] == "INV-42"
+
+        stats = client.stats()
+        assert stats["tasks"]["classify"]["batches"] == 1
+        assert stats["backend"]["connections_opened"] == 1
+        assert stats["backend"]["connections_reused"] == 2
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def test_warmup_builds_the_backend_up_front():
+    client = ModelClient(base_url="")
+    assert client._backend is None
+    assert client.warmup() == "local"
+    backend = client._backend
+    assert backend is not None
+
+    assert asyncio.run(client.classify("Invoice Number: INV-1 Total: 10"))
+    assert client._backend is backend
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_are_micro_batched()
+    test_batch_failure_reaches_every_caller()
+    test_http_backend_reuses_pooled_connections()
+    test_warmup_builds_the_backend_up_front()
+    print("Model client tests passed!")
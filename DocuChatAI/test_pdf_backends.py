@@ -0,0 +1,102 @@
+import asyncio
+import os
+import tempfile
+import tracemalloc
+
+import pdf_backends
+from pdf_backends import BACKENDS, PdfBackend, PdfExtractionError, PdfTextExtractor, normalize_pages
+from pipeline_stages import PipelineStages
+
+
+class _CountingBackend(PdfBackend):
+    name = "counting"
+    module = "json"
+
+    def __init__(self, pages=None, error=None):
+        self.pages = pages
+        self.error = error
+        self.calls = 0
+
+    def extract_pages(self, file_path):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.pages
+
+
+def _extractor(*backends):
+    extractor = PdfTextExtractor(["pypdf2"])
+    extractor.backends = list(backends)
+    return extractor
+
+
+def test_text_is_normalized_to_one_shape():
+    assert normalize_pages(["Total: 10  \r\nVendor\r", "Page two\x00"]) == "Total: 10\nVendor\n\nPage two\n"
+
+
+def test_falls_back_and_caches_extracted_text():
+    broken = _CountingBackend(error=RuntimeError("xref table is corrupt"))
+    working = _CountingBackend(pages=["Invoice Number: INV-1"])
+    extractor = _extractor(broken, working)
+
+    assert extractor.extract_text("sample_docs/sample_invoice.pdf") == "Invoice Number: INV-1\n"
+    assert extractor.extract_text("sample_docs/sample_invoice.pdf") == "Invoice Number: INV-1\n"
+    assert (broken.calls, working.calls) == (1, 1)
+
+
+def test_all_backends_failing_raises():
+    extractor = _extractor(_CountingBackend(error=ValueError("EOF marker not found")))
+    try:
+        extractor.extract_text("sample_docs/sample_invoice.pdf")
+    except PdfExtractionError as e:
+        assert "EOF marker not found" in str(e)
+    else:
+        raise AssertionError("expected PdfExtractionError")
+
+
+def test_malformed_pdf_fails_extraction_instead_of_returning_error_text():
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(b"%PDF-1.4 this is not really a pdf")
+    try:
+        doc_type, output, confidence = asyncio.run(PipelineStages.classify_document(f.name))
+        assert doc_type == "UNKNOWN" and confidence == 0.0 and "error" in output
+    finally:
+        os.unlink(f.name)
+
+
+def test_available_backends_agree_on_sample_invoice():
+    texts = {
+        name: normalize_pages(backend.extract_pages("sample_docs/sample_invoice.pdf"))
+        for name, backend in BACKENDS.items()
+        if backend.available()
+    }
+    for text in texts.values():
+        assert "Invoice Number: INV-2025-101" in text
+
+
+def test_benchmark_times_extraction_without_tracing():
+    class _TracingProbe(_CountingBackend):
+        def extract_pages(self, file_path):
+            self.traced = getattr(self, "traced", []) + [tracemalloc.is_tracing()]
+            return super().extract_pages(file_path)
+
+    probe = _TracingProbe(pages=["Invoice Number: INV-1"])
+    BACKENDS["probe"] = probe
+    try:
+        result = pdf_backends._benchmark_backend("probe", ["sample_docs/sample_invoice.pdf"], 3)
+    finally:
+        del BACKENDS["probe"]
+
+    # Three timed runs without tracemalloc, then one traced pass for memory.
+    assert probe.traced == [False, False, False, True]
+    assert result["pages"] == 3 and result["failures"] == 0
+
+
+if __name__ == "__main__":
+    test_text_is_normalized_to_one_shape()
+    test_falls_back_and_caches_extracted_text()
+    test_all_backends_failing_raises()
+    test_malformed_pdf_fails_extraction_instead_of_returning_error_text()
+    test_available_backends_agree_on_sample_invoice()
+    test_benchmark_times_extraction_without_tracing()
+    print("PDF backend tests passed!")
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import search_index
+from database import SessionLocal, init_db, Document, SEARCH_TABLE
+from search_index import build_match_query, index_document, search_available, search_documents
+
+
+def _index(db, document_id, document_type, status, data):
+    db.add(Document(id=document_id, filename=f"{document_id}.pdf", file_path="", status=status,
+                    document_type=document_type))
+    index_document(db, document_id, f"{document_id}.pdf", document_type, data)
+    db.commit()
+
+
+def test_search_ranks_and_filters_documents():
+    init_db()
+    db = SessionLocal()
+    _index(db, "inv-acme", "INVOICE", "completed",
+           {"vendor_name": "Acme Trading", "invoice_number": "INV-7", "model_version": "textract-analyze-v3.0"})
+    _index(db, "inv-other", "INVOICE", "failed", {"vendor_name": "Gulf Supplies", "notes": "acme referral"})
+    _index(db, "stmt-acme", "BANK_STATEMENT", "completed", {"account_holder": "Acme Trading"})
+
+    found = search_documents(db, "acme", document_type="INVOICE")
+    assert [r["document_id"] for r in found["results"]] == ["inv-acme", "inv-other"]
+    assert "[Acme]" in found["results"][0]["snippet"]
+
+    assert search_documents(db, "acme", status="failed")["total"] == 1
+    assert search_documents(db, "textract")["total"] == 0
+    assert search_documents(db, "acme", limit=1, offset=1)["total"] == 3
+
+    index_document(db, "inv-acme", "inv-acme.pdf", "INVOICE", {"vendor_name": "Renamed Vendor"})
+    db.commit()
+    assert search_documents(db, "trading", document_type="INVOICE")["total"] == 0
+    assert search_documents(db, "renamed")["results"][0]["document_id"] == "inv-acme"
+    db.close()
+
+
+def test_query_syntax_is_escaped():
+    assert build_match_query('vendor: "Acme" OR NEAR(') == '"vendor" "Acme" "OR" "NEAR"'
+    assert build_match_query("INV-20*") == '"INV" "20"*'
+    assert build_match_query("  ") == ""
+
+
+def test_missing_search_table_is_not_cached():
+    # A search made before the table exists must not disable search for good.
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'unmigrated.db')}")
+    db = sessionmaker(bind=engine)()
+    cached = search_index._available
+    search_index._available = False
+    try:
+        assert not search_available(db)
+        db.execute(text(f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(content)"))
+        db.commit()
+        assert search_available(db)
+    finally:
+        search_index._available = cached
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_search_ranks_and_filters_documents()
+    test_query_syntax_is_escaped()
+    test_missing_search_table_is_not_cached()
+    print("Search index tests passed!")
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+os.environ["BASIRA_INPROCESS_WORKER"] = "0"
+
+from fastapi.testclient import TestClient
+
+
+def test_importing_the_api_skips_heavy_modules():
+    probe = (
+        "import sys, main; "
+        "print(','.join(m for m in ('sqlalchemy', 'PyPDF2', 'database', 'worker') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_shutdown_before_warmup_loads_nothing():
+    probe = (
+        "import sys, main; main.shutdown_event(); "
+        "print(','.join(m for m in ('sqlalchemy', 'lineage_journal', 'guardrails', 'worker') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_schema_fingerprint_makes_init_db_idempotent():
+    from database import init_db, schema_is_current
+
+    init_db()
+    assert schema_is_current()
+    assert init_db() is False
+
+
+def test_health_and_readiness():
+    import main
+
+    with TestClient(main.app) as client:
+        assert client.get("/healthz").json() == {"status": "ok"}
+
+        deadline = time.monotonic() + 30
+        response = client.get("/readyz")
+        while response.status_code == 503 and time.monotonic() < deadline:
+            assert response.json()["status"] == "starting"
+            time.sleep(0.05)
+            response = client.get("/readyz")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert client.get("/").text == main._index_html()
+
+
+def _wait_for(client, path, predicate):
+    deadline = time.monotonic() + 30
+    response = client.get(path)
+    while not predicate(response) and time.monotonic() < deadline:
+        time.sleep(0.02)
+        response = client.get(path)
+    assert predicate(response), response.json()
+    return response
+
+
+def test_failed_warmup_is_retried_and_api_waits_for_it():
+    import main
+
+    original_warm_up, original_max = main._warm_up, main.WARMUP_RETRY_MAX_SECONDS
+    attempts = []
+    unblock = threading.Event()
+
+    def flaky_warm_up():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError("database is not reachable")
+        unblock.wait(30)
+        return original_warm_up()
+
+    main._warm_up = flaky_warm_up
+    main.WARMUP_RETRY_MAX_SECONDS = 0.05
+    main.readiness.update(ready=False, error=None, warmup_attempts=0)
+    try:
+        with TestClient(main.app) as client:
+            _wait_for(client, "/readyz", lambda r: len(attempts) == 2)
+            response = client.get("/readyz")
+            assert response.status_code == 503
+            assert response.json()["status"] == "retrying"
+            assert response.json()["error"] == "database is not reachable"
+            assert client.get("/api/documents").status_code == 503
+            assert client.get("/api/export/gold").status_code == 503
+
+            unblock.set()
+            _wait_for(client, "/readyz", lambda r: r.status_code == 200)
+            assert client.get("/api/documents").status_code == 200
+            assert main.readiness["warmup_attempts"] == 2
+            assert main.readiness["error"] is None
+    finally:
+        unblock.set()
+        main._warm_up, main.WARMUP_RETRY_MAX_SECONDS = original_warm_up, original_max
+
+
+if __name__ == "__main__":
+    test_importing_the_api_skips_heavy_modules()
+    test_shutdown_before_warmup_loads_nothing()
+    test_schema_fingerprint_makes_init_db_idempotent()
+    test_health_and_readiness()
+    test_failed_warmup_is_retried_and_api_waits_for_it()
+    print("Startup tests passed!")
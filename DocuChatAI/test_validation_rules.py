@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from pipeline_stages import PipelineStages
+from validation_rules import RuleEngine
+
+
+def test_rule_names_match_previous_output():
+    engine = RuleEngine()
+
+    assert engine.evaluate(
+        {"total_amount": 1500.0, "vendor_name": "Example Tech Solutions", "invoice_number": "INV-2025-101",
+         "line_items": []},
+        "INVOICE"
+    ) == (True, ["total_amount_present", "vendor_name_present", "invoice_number_present",
+                 "all_mandatory_fields_present"], [])
+
+    assert engine.evaluate({"total_amount": "1500", "vendor_name": None}, "INVOICE") == (
+        False, [], ["total_amount_missing_or_invalid", "vendor_name_missing", "invoice_number_missing"]
+    )
+    assert engine.evaluate({"id_number": "[REDACTED-NATIONAL_ID]"}, "NATIONAL_ID") == (
+        False, ["id_number_present"], ["name_missing"]
+    )
+    assert engine.evaluate({}, "PAYSLIP") == (True, ["all_mandatory_fields_present"], [])
+
+
+def test_line_items_are_cross_checked_against_total():
+    engine = RuleEngine()
+    invoice = {"total_amount": 1500.0, "vendor_name": "Example", "invoice_number": "INV-1",
+               "line_items": [{"total": 1000.0}, {"total": 500.0}]}
+
+    is_valid, passed, _ = engine.evaluate(invoice, "INVOICE")
+    assert is_valid and "total_matches_line_items" in passed
+
+    invoice["line_items"][1]["total"] = 400.0
+    is_valid, _, failed = engine.evaluate(invoice, "INVOICE")
+    assert not is_valid and failed == ["total_does_not_match_line_items"]
+
+
+def test_custom_rules_compile_range_and_regex_checks():
+    engine = RuleEngine({
+        "PAYSLIP": [
+            {"check": "range", "field": "net_salary", "min": 0, "max": 1000000,
+             "pass": "net_salary_in_range", "fail": "net_salary_out_of_range"},
+            {"check": "regex", "field": "employee_id", "pattern": r"EMP-\d{4}", "optional": True,
+             "pass": "employee_id_well_formed", "fail": "employee_id_malformed"}
+        ]
+    })
+
+    assert engine.evaluate({"net_salary": 8500.0, "employee_id": None}, "PAYSLIP") == (
+        True, ["net_salary_in_range", "all_mandatory_fields_present"], []
+    )
+    assert engine.evaluate({"net_salary": -1, "employee_id": "E1"}, "PAYSLIP") == (
+        False, [], ["net_salary_out_of_range", "employee_id_malformed"]
+    )
+
+
+def test_batch_matches_single_record_evaluation():
+    records = [
+        {"total_amount": 10.0, "vendor_name": "A", "invoice_number": "1"},
+        {"account_number": "SA03"},
+        {"total_amount": None},
+        {"name": "Sara", "id_number": None}
+    ]
+    types = ["INVOICE", "BANK_STATEMENT", "INVOICE", "NATIONAL_ID"]
+
+    batched = PipelineStages.validate_batch(records, types)
+    single = [asyncio.run(PipelineStages.validate_data(r, t)) for r, t in zip(records, types)]
+    assert batched == single
+
+
+def test_optional_number_is_skipped_when_empty():
+    engine = RuleEngine({
+        "PAYSLIP": [
+            {"check": "number", "field": "bonus", "optional": True,
+             "pass": "bonus_is_number", "fail": "bonus_not_a_number"}
+        ]
+    })
+
+    assert engine.evaluate({"bonus": None}, "PAYSLIP") == (True, ["all_mandatory_fields_present"], [])
+    assert engine.evaluate({"bonus": 250.0}, "PAYSLIP") == (
+        True, ["bonus_is_number", "all_mandatory_fields_present"], []
+    )
+    assert engine.evaluate({"bonus": "n/a"}, "PAYSLIP") == (False, [], ["bonus_not_a_number"])
+
+
+def test_batch_validation_is_faster_than_per_record():
+    engine = RuleEngine()
+    records = [
+        {"total_amount": float(i), "vendor_name": "Vendor", "invoice_number": f"INV-{i}", "line_items": []}
+        for i in range(1, 20001)
+    ]
+
+    # Best of three runs each, compared with each other rather than with a
+    # fixed records/s floor that depends on the machine.
+    batch_seconds = per_record_seconds = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        results = engine.evaluate_batch(records, "INVOICE")
+        batch_seconds = min(batch_seconds, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        single = [engine.evaluate(record, "INVOICE") for record in records]
+        per_record_seconds = min(per_record_seconds, time.perf_counter() - started)
+
+    assert results == single
+    assert all(is_valid for is_valid, _, _ in results)
+    assert per_record_seconds / batch_seconds > 1.5
+
+
+if __name__ == "__main__":
+    test_rule_names_match_previous_output()
+    test_line_items_are_cross_checked_against_total()
+    test_custom_rules_compile_range_and_regex_checks()
+    test_batch_matches_single_record_evaluation()
+    test_optional_number_is_skipped_when_empty()
+    test_batch_validation_is_faster_than_per_record()
+    print("Validation rule tests passed!")
@@ -0,0 +1,111 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "BASIRA_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'basira_test.db')}"
+)
+
+from database import SessionLocal, init_db, Document
+from worker import DocumentProcessor, MAX_ATTEMPTS
+
+
+def _queue_document(db, document_id, priority="standard", uploaded_at=None):
+    db.add(Document(
+        id=document_id,
+        filename=f"{document_id}.pdf",
+        file_path=f"uploads/{document_id}.pdf",
+        upload_timestamp=uploaded_at or datetime.utcnow(),
+        current_stage="queued",
+        status="processing",
+        priority=priority
+    ))
+    db.commit()
+
+
+def _fresh_db():
+    init_db()
+    db = SessionLocal()
+    db.query(Document).delete()
+    db.commit()
+    return db
+
+
+def test_only_one_worker_wins_the_lease():
+    db = _fresh_db()
+    _queue_document(db, "doc-1")
+
+    first = DocumentProcessor(worker_id="worker-a")
+    second = DocumentProcessor(worker_id="worker-b")
+
+    assert first.claim_document(db) == "doc-1"
+    assert second.claim_document(db) is None
+    assert second.renew_lease("doc-1") is False
+    assert first.renew_lease("doc-1") is True
+    db.close()
+
+
+def test_expired_lease_is_reclaimed():
+    db = _fresh_db()
+    _queue_document(db, "doc-2")
+
+    crashed = DocumentProcessor(worker_id="worker-a")
+    survivor = DocumentProcessor(worker_id="worker-b")
+    assert crashed.claim_document(db) == "doc-2"
+
+    db.query(Document).filter(Document.id == "doc-2").update({
+        Document.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)
+    })
+    db.commit()
+
+    assert survivor.claim_document(db) == "doc-2"
+    document = db.query(Document).filter(Document.id == "doc-2").first()
+    assert document.lease_owner == "worker-b"
+    assert document.attempts == 2
+    db.close()
+
+
+def test_released_lease_is_claimable_again():
+    db = _fresh_db()
+    _queue_document(db, "doc-3")
+
+    worker = DocumentProcessor(worker_id="worker-a")
+    assert worker.claim_document(db) == "doc-3"
+    worker.release_lease("doc-3")
+    assert DocumentProcessor(worker_id="worker-b").claim_document(db) == "doc-3"
+    db.close()
+
+
+def test_document_fails_after_max_attempts():
+    db = _fresh_db()
+    _queue_document(db, "doc-4")
+    db.query(Document).filter(Document.id == "doc-4").update({Document.attempts: MAX_ATTEMPTS})
+    db.commit()
+
+    assert DocumentProcessor(worker_id="worker-a").claim_document(db) is None
+    document = db.query(Document).filter(Document.id == "doc-4").first()
+    db.refresh(document)
+    assert document.status == "failed"
+    assert "attempts" in document.error_message
+    db.close()
+
+
+def test_interactive_document_jumps_batch_backlog():
+    db = _fresh_db()
+    earlier = datetime.utcnow() - timedelta(seconds=30)
+    for i in range(5):
+        _queue_document(db, f"batch-{i}", priority="batch", uploaded_at=earlier + timedelta(seconds=i))
+    _queue_document(db, "national-id", priority="interactive")
+
+    assert DocumentProcessor(worker_id="worker-a").claim_document(db) == "national-id"
+    db.close()
+
+
+if __name__ == "__main__":
+    test_only_one_worker_wins_the_lease()
+    test_expired_lease_is_reclaimed()
+    test_released_lease_is_claimable_again()
+    test_document_fails_after_max_attempts()
+    test_interactive_document_jumps_batch_backlog()
+    print("Worker leasing tests passed!")
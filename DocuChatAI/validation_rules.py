@@ -0,0 +1,188 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Rules are data: each entry names a check, the field(s) it reads and the
+# rule names reported in passed_rules / failed_rules. Checks marked
+# "optional" are skipped (reported in neither list) when the field is empty.
+VALIDATION_RULES: Dict[str, List[Dict[str, Any]]] = {
+    "INVOICE": [
+        {"check": "number", "field": "total_amount",
+         "pass": "total_amount_present", "fail": "total_amount_missing_or_invalid"},
+        {"check": "present", "field": "vendor_name",
+         "pass": "vendor_name_present", "fail": "vendor_name_missing"},
+        {"check": "present", "field": "invoice_number",
+         "pass": "invoice_number_present", "fail": "invoice_number_missing"},
+        {"check": "sum_matches", "field": "total_amount", "items": "line_items", "item_field": "total",
+         "tolerance": 0.01, "optional": True,
+         "pass": "total_matches_line_items", "fail": "total_does_not_match_line_items"}
+    ],
+    "NATIONAL_ID": [
+        {"check": "present", "field": "id_number",
+         "pass": "id_number_present", "fail": "id_number_missing"},
+        {"check": "present", "field": "name",
+         "pass": "name_present", "fail": "name_missing"}
+    ],
+    "BANK_STATEMENT": [
+        {"check": "present", "field": "account_number",
+         "pass": "account_number_present", "fail": "account_number_missing"}
+    ]
+}
+
+ALL_RULES_PASSED = "all_mandatory_fields_present"
+
+TYPE_NAMES = {
+    "string": (str,),
+    "number": (int, float),
+    "list": (list,),
+    "object": (dict,)
+}
+
+Column = List[Any]
+Evaluator = Callable[[Callable[[str], Column]], List[Optional[bool]]]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == []
+
+
+def _compile_rule(rule: Dict[str, Any]) -> Evaluator:
+    check = rule["check"]
+    field = rule.get("field")
+    optional = rule.get("optional", False)
+
+    def skip_empty(values: Column, results: List[Optional[bool]]) -> List[Optional[bool]]:
+        if not optional:
+            return results
+        return [None if _is_empty(v) else r for v, r in zip(values, results)]
+
+    if check == "present":
+        def evaluate(column):
+            values = column(field)
+            return skip_empty(values, [bool(v) for v in values])
+        return evaluate
+
+    if check == "number":
+        def evaluate(column):
+            values = column(field)
+            return skip_empty(values, [bool(v) and isinstance(v, (int, float)) for v in values])
+        return evaluate
+
+    if check == "type":
+        types = TYPE_NAMES[rule["type"]]
+
+        def evaluate(column):
+            values = column(field)
+            return skip_empty(values, [isinstance(v, types) for v in values])
+        return evaluate
+
+    if check == "range":
+        low = rule.get("min", float("-inf"))
+        high = rule.get("max", float("inf"))
+
+        def evaluate(column):
+            values = column(field)
+            return skip_empty(values, [
+                isinstance(v, (int, float)) and low <= v <= high for v in values
+            ])
+        return evaluate
+
+    if check == "regex":
+        pattern = re.compile(rule["pattern"])
+
+        def evaluate(column):
+            values = column(field)
+            return skip_empty(values, [
+                isinstance(v, str) and pattern.fullmatch(v) is not None for v in values
+            ])
+        return evaluate
+
+    if check == "sum_matches":
+        items_field = rule["items"]
+        item_field = rule["item_field"]
+        tolerance = rule.get("tolerance", 0.0)
+
+        def line_total(items: Any) -> Optional[float]:
+            if not isinstance(items, list):
+                return None
+            amounts = [item.get(item_field) for item in items if isinstance(item, dict)]
+            if not amounts or not all(isinstance(a, (int, float)) for a in amounts):
+                return None
+            return sum(amounts)
+
+        def evaluate(column):
+            totals = column(field)
+            items = column(items_field)
+            results = []
+            for total, line_items in zip(totals, items):
+                computed = line_total(line_items)
+                if computed is None or not isinstance(total, (int, float)):
+                    results.append(None if optional else False)
+                else:
+                    results.append(abs(computed - total) <= tolerance)
+            return skip_empty(items, results)
+        return evaluate
+
+    raise ValueError(f"Unknown validation check '{check}'")
+
+
+class CompiledRuleSet:
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = [(rule["pass"], rule["fail"], _compile_rule(rule)) for rule in rules]
+
+    def evaluate_batch(self, records: Sequence[Dict[str, Any]]) -> List[Tuple[bool, List[str], List[str]]]:
+        columns: Dict[str, Column] = {}
+
+        def column(field: str) -> Column:
+            if field not in columns:
+                columns[field] = [(record or {}).get(field) for record in records]
+            return columns[field]
+
+        rule_results = [(passed, failed, evaluate(column)) for passed, failed, evaluate in self.rules]
+
+        results = []
+        for i in range(len(records)):
+            passed_rules = []
+            failed_rules = []
+            for passed_name, failed_name, outcomes in rule_results:
+                outcome = outcomes[i]
+                if outcome is True:
+                    passed_rules.append(passed_name)
+                elif outcome is False:
+                    failed_rules.append(failed_name)
+            if not failed_rules:
+                passed_rules.append(ALL_RULES_PASSED)
+            results.append((len(failed_rules) == 0, passed_rules, failed_rules))
+        return results
+
+
+class RuleEngine:
+
+    def __init__(self, rules: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        rules = VALIDATION_RULES if rules is None else rules
+        self._rule_sets = {doc_type: CompiledRuleSet(specs) for doc_type, specs in rules.items()}
+        self._empty = CompiledRuleSet([])
+
+    def evaluate(self, record: Dict[str, Any], document_type: str) -> Tuple[bool, List[str], List[str]]:
+        return self.evaluate_batch([record], document_type)[0]
+
+    def evaluate_batch(self, records: Sequence[Dict[str, Any]],
+                       document_type: str) -> List[Tuple[bool, List[str], List[str]]]:
+        return self._rule_sets.get(document_type, self._empty).evaluate_batch(records)
+
+    def evaluate_many(self, records: Sequence[Dict[str, Any]],
+                      document_types: Sequence[str]) -> List[Tuple[bool, List[str], List[str]]]:
+        groups: Dict[str, List[int]] = {}
+        for index, document_type in enumerate(document_types):
+            groups.setdefault(document_type, []).append(index)
+
+        results: List[Any] = [None] * len(records)
+        for document_type, indexes in groups.items():
+            outcomes = self.evaluate_batch([records[i] for i in indexes], document_type)
+            for index, outcome in zip(indexes, outcomes):
+                results[index] = outcome
+        return results
+
+
+rule_engine = RuleEngine()
@@ -1,15 +1,45 @@
+import argparse
 import asyncio
+import multiprocessing
+import os
+import signal
+import socket
 import time
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
-from database import SessionLocal, Document, StageRun, LineageLog, MedallionData
+from database import SessionLocal, init_db, Document, StageRun, MedallionData
 from pipeline_stages import PipelineStages
+from scheduler import FairScheduler
+from blob_store import blob_store
+from search_index import index_document
+from lineage_journal import lineage_journal
+from guardrails import BudgetExceeded, sandbox, scaled_stage_timeouts, within_budget
 import json
 
 
+LEASE_SECONDS = int(os.environ.get("BASIRA_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.environ.get("BASIRA_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL = float(os.environ.get("BASIRA_POLL_INTERVAL", "1.0"))
+CLAIM_BATCH_SIZE = 10
+CLAIM_RETRIES = 3
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
 class DocumentProcessor:
     
-    def __init__(self):
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: int = LEASE_SECONDS,
+                 stage_timeouts: Optional[Dict[str, float]] = None):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.stage_timeouts = dict(stage_timeouts or scaled_stage_timeouts())
+        self.scheduler = FairScheduler()
+        self._wakeup = asyncio.Event()
         self.stages = [
             ("classify", self.run_classification),
             ("extract", self.run_extraction),
@@ -19,57 +49,280 @@ class DocumentProcessor:
             ("medallion", self.run_medallion_promotion)
         ]
     
+    @staticmethod
+    def _claimable(now: datetime):
+        return (Document.status == "processing") & or_(
+            Document.lease_owner.is_(None),
+            Document.lease_expires_at < now
+        )
+    
+    def claim_document(self, db: Session, document_id: Optional[str] = None) -> Optional[str]:
+        now = datetime.utcnow()
+        claimable = self._claimable(now)
+        
+        if document_id is not None:
+            candidates = db.query(Document.id, Document.attempts).filter(
+                claimable, Document.id == document_id
+            ).all()
+            return self._claim_first(db, candidates, now)
+        
+        for _ in range(CLAIM_RETRIES):
+            lane, tenant, candidates = self.scheduler.next_candidates(db, claimable, now, CLAIM_BATCH_SIZE)
+            if lane is None:
+                return None
+            claimed = self._claim_first(db, candidates, now)
+            if claimed is not None:
+                self.scheduler.record_dispatch(lane, tenant)
+                return claimed
+        
+        return None
+    
+    def _claim_first(self, db: Session, candidates, now: datetime) -> Optional[str]:
+        for candidate_id, attempts in candidates:
+            if (attempts or 0) >= MAX_ATTEMPTS:
+                self._fail_exhausted(db, candidate_id, attempts, now)
+                continue
+            
+            # Compare-and-swap: only one worker's UPDATE can match while the
+            # lease is free or expired, so the rowcount decides the winner.
+            claimed = db.query(Document).filter(
+                Document.id == candidate_id,
+                self._claimable(now)
+            ).update({
+                Document.lease_owner: self.worker_id,
+                Document.lease_expires_at: now + timedelta(seconds=self.lease_seconds),
+                Document.attempts: func.coalesce(Document.attempts, 0) + 1,
+                Document.dispatched_at: func.coalesce(Document.dispatched_at, now)
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return candidate_id
+        
+        return None
+    
+    def claim_for_reprocessing(self, db: Session, document_id: str) -> bool:
+        now = datetime.utcnow()
+        claimed = db.query(Document).filter(
+            Document.id == document_id,
+            Document.status != "processing",
+            or_(Document.lease_owner.is_(None), Document.lease_expires_at < now)
+        ).update({
+            Document.lease_owner: self.worker_id,
+            Document.lease_expires_at: now + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+    
+    def _fail_exhausted(self, db: Session, document_id: str, attempts: int, now: datetime):
+        db.query(Document).filter(
+            Document.id == document_id,
+            self._claimable(now)
+        ).update({
+            Document.status: "failed",
+            Document.error_message: f"Abandoned after {attempts} attempts without completing",
+            Document.lease_owner: None,
+            Document.lease_expires_at: None
+        }, synchronize_session=False)
+        db.commit()
+    
+    def renew_lease(self, document_id: str) -> bool:
+        db = SessionLocal()
+        try:
+            renewed = db.query(Document).filter(
+                Document.id == document_id,
+                Document.lease_owner == self.worker_id
+            ).update({
+                Document.lease_expires_at: datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+            db.commit()
+            return renewed == 1
+        finally:
+            db.close()
+    
+    def release_lease(self, document_id: str):
+        db = SessionLocal()
+        try:
+            db.query(Document).filter(
+                Document.id == document_id,
+                Document.lease_owner == self.worker_id
+            ).update({
+                Document.lease_owner: None,
+                Document.lease_expires_at: None
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+    
+    def notify(self):
+        self._wakeup.set()
+    
+    async def _heartbeat(self, document_id: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.renew_lease(document_id):
+                print(f"Worker {self.worker_id} lost lease on {document_id}, abandoning")
+                task.cancel()
+                return
+    
     async def process_document(self, document_id: str):
         db = SessionLocal()
         try:
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if not document:
+            if self.claim_document(db, document_id) is None:
                 return
-            
-            context = {
-                "document_id": document_id,
-                "file_path": document.file_path,
-                "document_type": None,
-                "extracted_data": None,
-                "redacted_data": None,
-                "is_valid": False
-            }
-            
-            for stage_name, stage_func in self.stages:
-                document.current_stage = stage_name
-                db.commit()
-                
-                stage_run = StageRun(
-                    document_id=document_id,
-                    stage_name=stage_name,
-                    started_at=datetime.utcnow(),
-                    status="running"
-                )
-                db.add(stage_run)
-                db.commit()
-                
+        finally:
+            db.close()
+        
+        await self.process_leased_document(document_id)
+    
+    async def process_leased_document(self, document_id: str):
+        await self.hold_lease(document_id, self._run_pipeline(document_id))
+    
+    async def hold_lease(self, document_id: str, work):
+        task = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat(document_id, task))
+        try:
+            return await work
+        finally:
+            heartbeat.cancel()
+            self.release_lease(document_id)
+    
+    async def run_forever(self, concurrency: int = 4, poll_interval: float = POLL_INTERVAL,
+                          stop_event: Optional[asyncio.Event] = None):
+        stop_event = stop_event or asyncio.Event()
+        slots = asyncio.Semaphore(concurrency)
+        running = set()
+        
+        def on_done(task: asyncio.Task):
+            running.discard(task)
+            slots.release()
+        
+        try:
+            while not stop_event.is_set():
+                await slots.acquire()
+                db = SessionLocal()
                 try:
-                    await stage_func(db, stage_run, context)
-                    stage_run.status = "completed"
-                    stage_run.completed_at = datetime.utcnow()
-                except Exception as e:
-                    stage_run.status = "failed"
-                    stage_run.error_message = str(e)
-                    stage_run.completed_at = datetime.utcnow()
-                    document.status = "failed"
-                    document.error_message = f"Failed at stage {stage_name}: {str(e)}"
-                    db.commit()
-                    return
+                    document_id = self.claim_document(db)
+                finally:
+                    db.close()
                 
-                db.commit()
+                if document_id is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                
+                task = asyncio.create_task(self.process_leased_document(document_id))
+                running.add(task)
+                task.add_done_callback(on_done)
+        finally:
+            # Cancelling releases each lease so another worker can resume the
+            # documents straight away instead of waiting for expiry.
+            for task in list(running):
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+    
+    async def _run_pipeline(self, document_id: str):
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                return
             
-            document.status = "completed"
-            document.current_stage = "completed"
+            db.query(StageRun).filter(
+                StageRun.document_id == document_id,
+                StageRun.status == "running"
+            ).update({
+                StageRun.status: "abandoned",
+                StageRun.completed_at: datetime.utcnow(),
+                StageRun.error_message: "Worker stopped before the stage completed"
+            }, synchronize_session=False)
             db.commit()
             
+            context = self.new_context(document)
+            await self.run_stages(db, document, context)
+            
         finally:
             db.close()
     
+    @staticmethod
+    def new_context(document: Document) -> dict:
+        return {
+            "document_id": document.id,
+            "file_path": document.file_path,
+            "document_type": None,
+            "extracted_data": None,
+            "redacted_data": None,
+            "redacted_ref": None,
+            "is_valid": False
+        }
+    
+    async def run_stages(self, db: Session, document: Document, context: dict,
+                         start_stage: str = "classify") -> bool:
+        stage_names = [name for name, _ in self.stages]
+        for stage_name, stage_func in self.stages[stage_names.index(start_stage):]:
+            document.current_stage = stage_name
+            db.commit()
+            
+            stage_run = StageRun(
+                document_id=document.id,
+                stage_name=stage_name,
+                started_at=datetime.utcnow(),
+                status="running"
+            )
+            db.add(stage_run)
+            db.commit()
+            
+            try:
+                await within_budget(stage_name, stage_func(db, stage_run, context),
+                                    self.stage_timeouts.get(stage_name))
+                stage_run.status = "completed"
+                stage_run.completed_at = datetime.utcnow()
+            except BudgetExceeded as e:
+                # A retry would burn the same budget again on every attempt,
+                # so the document is parked for someone to look at instead.
+                self._quarantine(db, document, stage_run, stage_name, e)
+                return False
+            except Exception as e:
+                # Drops the stage's partial writes, e.g. a medallion rerun that
+                # already deleted the previous layers.
+                db.rollback()
+                stage_run.status = "failed"
+                stage_run.error_message = str(e)
+                stage_run.completed_at = datetime.utcnow()
+                document.status = "failed"
+                document.error_message = f"Failed at stage {stage_name}: {str(e)}"
+                db.commit()
+                return False
+            
+            db.commit()
+        
+        document.status = "completed"
+        document.current_stage = "completed"
+        document.error_message = None
+        db.commit()
+        return True
+    
+    @staticmethod
+    def _quarantine(db: Session, document: Document, stage_run: StageRun, stage_name: str, error: BudgetExceeded):
+        db.rollback()
+        stage_run.status = "budget_exceeded"
+        stage_run.error_message = str(error)
+        stage_run.completed_at = datetime.utcnow()
+        document.status = "quarantined"
+        document.error_message = f"Quarantined at stage {stage_name}: {error}"
+        db.commit()
+        
+        lineage_journal.append(
+            document.id,
+            "DOCUMENT_QUARANTINED",
+            event_metadata={"stage": stage_name, **error.details(), "reason": str(error)}
+        )
+        print(f"Quarantined {document.id} at stage {stage_name}: {error}")
+    
     async def run_classification(self, db: Session, stage_run: StageRun, context: dict):
         doc_type, output, confidence = await PipelineStages.classify_document(context["file_path"])
         
@@ -79,6 +332,7 @@ class DocumentProcessor:
         
         document = db.query(Document).filter(Document.id == context["document_id"]).first()
         document.document_type = doc_type
+        document.classification_model = PipelineStages.CLASSIFICATION_MODEL
     
     async def run_extraction(self, db: Session, stage_run: StageRun, context: dict):
         extracted_data, confidence = await PipelineStages.extract_data(
@@ -87,14 +341,18 @@ class DocumentProcessor:
         )
         
         context["extracted_data"] = extracted_data
-        stage_run.output_data = extracted_data
+        stage_run.output_data = blob_store.put(db, extracted_data)
         stage_run.confidence_score = confidence
+        
+        document = db.query(Document).filter(Document.id == context["document_id"]).first()
+        document.extraction_model = PipelineStages.EXTRACTION_MODEL
     
     async def run_pii_detection(self, db: Session, stage_run: StageRun, context: dict):
         pii_result = await PipelineStages.detect_and_redact_pii(context["extracted_data"])
         
         context["redacted_data"] = pii_result["redacted_data"]
-        stage_run.output_data = pii_result
+        context["redacted_ref"] = blob_store.put(db, pii_result["redacted_data"])
+        stage_run.output_data = {**pii_result, "redacted_data": context["redacted_ref"]}
         stage_run.confidence_score = 1.0 if pii_result["pii_detected"] else 0.95
     
     async def run_validation(self, db: Session, stage_run: StageRun, context: dict):
@@ -111,30 +369,44 @@ class DocumentProcessor:
             "validation_version": PipelineStages.VALIDATION_VERSION
         }
         stage_run.confidence_score = 1.0 if is_valid else 0.5
+        
+        document = db.query(Document).filter(Document.id == context["document_id"]).first()
+        document.validation_version = PipelineStages.VALIDATION_VERSION
     
     async def run_lineage_logging(self, db: Session, stage_run: StageRun, context: dict):
-        lineage = LineageLog(
-            document_id=context["document_id"],
-            timestamp=datetime.utcnow(),
-            event_type="PROCESSING_COMPLETED",
+        event_metadata = {
+            "document_type": context["document_type"],
+            "validation_status": "VALID" if context["is_valid"] else "INVALID"
+        }
+        if context.get("backfill_job_id"):
+            event_metadata["backfill_job_id"] = context["backfill_job_id"]
+            event_metadata["rerun_from_stage"] = context["rerun_from_stage"]
+        
+        # Appended to the lineage journal rather than added to this session:
+        # the flusher bulk-inserts it into lineage_log outside the pipeline's transaction.
+        event = lineage_journal.append(
+            context["document_id"],
+            "REPROCESSING_COMPLETED" if context.get("backfill_job_id") else "PROCESSING_COMPLETED",
             classification_model=PipelineStages.CLASSIFICATION_MODEL,
             extraction_model=PipelineStages.EXTRACTION_MODEL,
             validation_version=PipelineStages.VALIDATION_VERSION,
             execution_arn=f"arn:aws:states:us-east-1:xxx:execution:basira-pipeline:{context['document_id']}",
-            event_metadata={
-                "document_type": context["document_type"],
-                "validation_status": "VALID" if context["is_valid"] else "INVALID"
-            }
+            event_metadata=event_metadata
         )
-        db.add(lineage)
         
         stage_run.output_data = {
             "lineage_logged": True,
-            "execution_arn": lineage.execution_arn
+            "execution_arn": event["execution_arn"]
         }
         stage_run.confidence_score = 1.0
     
     async def run_medallion_promotion(self, db: Session, stage_run: StageRun, context: dict):
+        # Reprocessing replaces the layers; a document that no longer
+        # validates must not keep its old gold row.
+        db.query(MedallionData).filter(
+            MedallionData.document_id == context["document_id"]
+        ).delete(synchronize_session=False)
+        
         bronze_data = MedallionData(
             document_id=context["document_id"],
             layer="bronze",
@@ -152,7 +424,7 @@ class DocumentProcessor:
             document_id=context["document_id"],
             layer="silver",
             data={
-                "redacted_data": context["redacted_data"],
+                "redacted_data": context["redacted_ref"],
                 "pii_redacted": True,
                 "extraction_model": PipelineStages.EXTRACTION_MODEL
             }
@@ -164,7 +436,7 @@ class DocumentProcessor:
                 document_id=context["document_id"],
                 layer="gold",
                 data={
-                    "curated_data": context["redacted_data"],
+                    "curated_data": context["redacted_ref"],
                     "document_type": context["document_type"],
                     "validation_status": "VALIDATED_SUCCESS",
                     "ready_for_analytics": True
@@ -172,6 +444,9 @@ class DocumentProcessor:
             )
             db.add(gold_data)
         
+        document = db.query(Document).filter(Document.id == context["document_id"]).first()
+        index_document(db, document.id, document.filename, context["document_type"], context["redacted_data"])
+        
         stage_run.output_data = {
             "bronze_created": True,
             "silver_created": True,
@@ -181,3 +456,76 @@ class DocumentProcessor:
 
 
 processor = DocumentProcessor()
+
+
+async def _serve(concurrency: int, poll_interval: float, lease_seconds: int):
+    worker = DocumentProcessor(lease_seconds=lease_seconds)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    
+    def stop():
+        stop_event.set()
+        worker.notify()
+    
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+    
+    await asyncio.to_thread(sandbox.warmup)
+    print(f"Worker {worker.worker_id} started with concurrency {concurrency}")
+    try:
+        await worker.run_forever(concurrency, poll_interval, stop_event)
+    finally:
+        # multiprocessing children exit without running atexit handlers.
+        lineage_journal.close()
+        sandbox.close()
+    print(f"Worker {worker.worker_id} stopped")
+
+
+def _worker_process(concurrency: int, poll_interval: float, lease_seconds: int):
+    asyncio.run(_serve(concurrency, poll_interval, lease_seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run standalone Basira pipeline workers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes to start on this host")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="documents processed concurrently per process")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="seconds to wait before polling again when the queue is empty")
+    parser.add_argument("--lease-seconds", type=int, default=LEASE_SECONDS,
+                        help="lease duration; a crashed worker's documents are retried after this")
+    args = parser.parse_args()
+    
+    init_db()
+    
+    if args.processes == 1:
+        _worker_process(args.concurrency, args.poll_interval, args.lease_seconds)
+        return
+    
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(
+            target=_worker_process,
+            args=(args.concurrency, args.poll_interval, args.lease_seconds),
+            name=f"basira-worker-{i}"
+        )
+        for i in range(args.processes)
+    ]
+    for proc in workers:
+        proc.start()
+    
+    def forward(signum, frame):
+        for proc in workers:
+            if proc.is_alive():
+                proc.terminate()
+    
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    
+    for proc in workers:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()